@@ -0,0 +1,190 @@
+"""
+Monthly archive of invoice PDFs, as a ZIP streamed without holding the archive in memory.
+
+PDFs already in PDF_CACHE_DIR are reused; the others are rendered across a process
+pool, one WeasyPrint render per process. GET /invoice_archive requests share one pool
+of ARCHIVE_WORKERS processes. Also a CLI:
+
+    python archive.py --year 2024 --month 12 --output invoices_2024_12.zip
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from threading import Lock
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tqdm import tqdm
+from database import ReplicaSessionLocal
+from models import Invoice, Item
+from utils import merge_invoice_details
+import rendering
+
+def available_cores() -> int:
+    # Cores this process may run on, which can be fewer than the machine has
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "0")) or available_cores()
+
+_pool = None
+_pool_lock = Lock()
+
+def render_pool(workers: int = ARCHIVE_WORKERS) -> ProcessPoolExecutor:
+    """
+    The process pool shared by every archive of this process, created on first use.
+    Concurrent archives queue their renders in it instead of starting processes of their own.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads (the server) can deadlock the children
+            _pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=rendering.warm_up
+            )
+        return _pool
+
+def shutdown(pool: Optional[ProcessPoolExecutor] = None):
+    # Stop the shared pool (or the given one), dropping the renders not started yet
+    global _pool
+    with _pool_lock:
+        if pool is None or pool is _pool:
+            pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def month_invoice_details(db: Session, year: int, month: int) -> list:
+    """
+    Details of every invoice of a month, ordered by invoice_id, with two queries.
+    Words still pending are left pending: callers wait for the worker (see pending_words).
+    db may be a read replica session, so nothing is written through it.
+    """
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    condition = (Invoice.invoice_date >= start) & (Invoice.invoice_date < end)
+
+    invoices = db.query(Invoice).filter(condition).order_by(Invoice.invoice_id).all()
+    items = db.query(Item).filter(
+        Item.invoice_id.in_(select(Invoice.invoice_id).where(condition))
+    ).order_by(Item.invoice_id, Item.item_id).all()
+
+    return list(merge_invoice_details(invoices, items))
+
+def pending_words(invoices: list) -> int:
+    # Invoices whose amount in words the worker has not stored yet; their PDFs cannot be rendered
+    return sum(1 for invoice in invoices if invoice["words_pending"])
+
+def check_renderer(invoices: list):
+    # Raise RuntimeError up front if some PDF must be rendered and WeasyPrint cannot load
+    if not all(os.path.exists(rendering.invoice_pdf_cache_path(invoice)) for invoice in invoices):
+        rendering.load_weasyprint()
+
+def invoice_pdf_paths(invoices: list, pool: Optional[ProcessPoolExecutor] = None, progress: bool = False):
+    """
+    Yield (invoice, pdf path) as PDFs become available: cached ones first, then the
+    ones rendered by the process pool in completion order. Closing the generator early
+    (client gone) cancels the renders still queued.
+    - pool: ProcessPoolExecutor -> Pool rendering the missing PDFs (default: render_pool()).
+    - progress: bool -> Show a tqdm progress bar on stderr.
+    """
+    missing = []
+    with tqdm(total=len(invoices), unit="invoice", disable=not progress) as bar:
+        for invoice in invoices:
+            path = rendering.invoice_pdf_cache_path(invoice)
+            if os.path.exists(path):
+                bar.update()
+                yield invoice, path
+            else:
+                missing.append(invoice)
+
+        if not missing:
+            return
+
+        pool = pool or render_pool()
+        futures = {}
+        try:
+            for invoice in missing:
+                futures[pool.submit(rendering.invoice_pdf_path, invoice)] = invoice
+            for future in as_completed(futures):
+                bar.update()
+                yield futures[future], future.result()
+        except BrokenProcessPool:
+            # A render process died: the next archive starts a new pool
+            shutdown(pool)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+class _ChunkBuffer:
+    # Write-only file object for zipfile: it collects the bytes until the stream takes them
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(pdf_paths):
+    """
+    Yield a ZIP archive of (invoice, pdf path) pairs chunk by chunk. Entries are stored
+    (PDFs are already compressed) and written with data descriptors, so at most one
+    PDF is buffered at a time.
+    """
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for invoice, path in pdf_paths:
+            archive.write(path, f"{invoice['invoice_number']}.pdf")
+            yield buffer.take()
+    yield buffer.take()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--month", type=int, required=True)
+    parser.add_argument("--output", help="ZIP file to write (default invoices_<year>_<month>.zip)")
+    parser.add_argument("--workers", type=int, default=ARCHIVE_WORKERS)
+    args = parser.parse_args()
+
+    db = ReplicaSessionLocal()
+    try:
+        invoices = month_invoice_details(db, args.year, args.month)
+    finally:
+        db.close()
+    if not invoices:
+        sys.exit(f"No invoices in {args.month:02d}/{args.year}.")
+    pending = pending_words(invoices)
+    if pending:
+        sys.exit(f"Invoices with the amount in words still pending: {pending}, try again shortly.")
+
+    try:
+        check_renderer(invoices)
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+    output = args.output or f"invoices_{args.year}_{args.month:02d}.zip"
+    pool = render_pool(args.workers)
+    try:
+        with open(output, "wb") as f:
+            for chunk in stream_zip(invoice_pdf_paths(invoices, pool, progress=True)):
+                f.write(chunk)
+    finally:
+        shutdown()
+    print(f"{len(invoices)} invoices written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare two load_test.py results: throughput and latency percentiles side by side.
+
+Exits with status 1 if a p95 latency grew by more than --threshold percent, so it
+can gate a release against the previous one.
+
+    python benchmarks/compare.py before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+PERCENTILES = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before, after):
+    if not before:
+        return "     n/a"
+    return f"{(after - before) / before * 100:+7.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, help="Fail when a p95 grew by more than this percent")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{before.get('revision')} -> {after.get('revision')}")
+
+    regressions = []
+    for mode, new in after["results"].items():
+        old = before["results"].get(mode)
+        if old is None:
+            continue
+        rps = (old["requests_per_second"], new["requests_per_second"])
+        print(f"\n{mode}: {rps[0]:.1f} -> {rps[1]:.1f} req/s {change(*rps)}")
+        for operation, new_stats in new["operations"].items():
+            old_stats = old["operations"].get(operation)
+            if old_stats is None:
+                continue
+            cells = [
+                f"{name[:3]} {old_stats[name]:8.2f} -> {new_stats[name]:8.2f} ms {change(old_stats[name], new_stats[name])}"
+                for name in PERCENTILES
+            ]
+            print(f"  {operation:<8} " + "  ".join(cells))
+            growth = (new_stats["p95_ms"] - old_stats["p95_ms"]) / old_stats["p95_ms"] * 100 if old_stats["p95_ms"] else 0
+            if args.threshold is not None and growth > args.threshold:
+                regressions.append(f"{mode} {operation} p95 {growth:+.1f}%")
+
+    if regressions:
+        print("\nRegressions: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
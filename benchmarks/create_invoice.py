@@ -0,0 +1,88 @@
+"""
+Statement count and latency of POST /create_invoice by number of invoice lines.
+
+Runs the app in-process against DATABASE_URL and counts the SQL statements sent
+per create. The benchmark invoices are deleted afterwards.
+
+    python benchmarks/create_invoice.py --lines 1 50 1000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from database import SessionLocal, engine
+from models import Invoice, Item, InvoiceSequence
+import main
+
+
+def invoice_request(lines, year, month):
+    return {
+        "client_name": "benchmark",
+        "vat_number": "0000000/A/M/000",
+        "address": "Sfax",
+        "invoice_date": f"01/{month:02d}/{year}",
+        "items": [
+            {"reference": f"REF{n:04d}", "quantity": 1 + n % 7, "designation": f"Article {n}", "unit_price": 12.345}
+            for n in range(lines)
+        ],
+    }
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 50, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--year", type=int, default=2099, help="Year used for the benchmark invoices")
+    parser.add_argument("--month", type=int, default=2)
+    args = parser.parse_args()
+
+    statements = []
+    commits = []
+    event.listen(engine, "before_cursor_execute", lambda *a: statements.append(1))
+    event.listen(engine, "commit", lambda *a: commits.append(1))
+
+    results = []
+    try:
+        with TestClient(main.app) as client:
+            for lines in args.lines:
+                body = invoice_request(lines, args.year, args.month)
+                counts, transactions, latencies = [], [], []
+                for _ in range(args.repeat):
+                    statements.clear()
+                    commits.clear()
+                    start = time.perf_counter()
+                    response = client.post("/create_invoice", json=body)
+                    latencies.append(time.perf_counter() - start)
+                    response.raise_for_status()
+                    counts.append(len(statements))
+                    transactions.append(len(commits))
+                results.append({
+                    "lines": lines,
+                    "statements": max(counts),
+                    "transactions": max(transactions),
+                    "latency_ms_p50": round(statistics.median(latencies) * 1000, 3),
+                    "latency_ms_max": round(max(latencies) * 1000, 3),
+                })
+    finally:
+        db = SessionLocal()
+        invoice_ids = db.query(Invoice.invoice_id).filter(Invoice.client_name == "benchmark")
+        db.query(Item).filter(Item.invoice_id.in_(invoice_ids)).delete(synchronize_session=False)
+        db.query(Invoice).filter(Invoice.client_name == "benchmark").delete(synchronize_session=False)
+        db.query(InvoiceSequence).filter(
+            InvoiceSequence.year == args.year, InvoiceSequence.month == args.month
+        ).delete()
+        db.commit()
+        db.close()
+
+    print(json.dumps({"database": engine.dialect.name, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main_()
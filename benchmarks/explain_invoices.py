@@ -0,0 +1,93 @@
+"""
+EXPLAIN-based check that the GET /invoices date filters use ix_invoices_date_number.
+
+Optionally loads --rows synthetic invoices (PostgreSQL generate_series), runs
+EXPLAIN on the queries built by main.invoices_query and exits with status 1 if
+any plan reads the invoices table with a sequential scan. The synthetic rows are
+deleted afterwards.
+
+    python benchmarks/explain_invoices.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from database import SessionLocal
+from utils import encode_cursor
+import main
+
+CASES = {
+    "year": {"year": 2020},
+    "year_month": {"year": 2020, "month": 6},
+    "year_month_day": {"year": 2020, "month": 6, "day": 15},
+    "date_range": {"date_from": "01/03/2021", "date_to": "15/03/2021"},
+    "cursor": {"year": 2020, "cursor": encode_cursor(date(2020, 6, 1), "")},
+}
+
+
+def load_rows(db, rows):
+    # ~25 years of invoices spread over days, all tagged client_name = 'benchmark'
+    db.execute(text("""
+        INSERT INTO invoices (invoice_number, client_name, vat_number, address, invoice_date,
+                              subtotal_ht, montant_tva, timbre_price, final_price, final_price_in_words)
+        SELECT 'bench_' || g, 'benchmark', '0000000/A/M/000', 'Sfax', date '2000-01-01' + (g % 9131),
+               100.000, 7.000, 1.000, 108.000, 'Cent huit dinars'
+        FROM generate_series(1, :rows) AS g
+    """), {"rows": rows})
+    db.commit()
+    db.execute(text("ANALYZE invoices"))
+
+
+def scans(plan):
+    # (node type, relation, index) of every node reading the invoices table
+    found = []
+    if plan.get("Relation Name") == "invoices":
+        found.append((plan["Node Type"], plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        found.extend(scans(child))
+    return found
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=0, help="Synthetic invoices to load first")
+    parser.add_argument("--limit", type=int, default=main.INVOICES_PAGE_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    if db.get_bind().dialect.name != "postgresql":
+        sys.exit("This check needs PostgreSQL.")
+
+    results = {}
+    try:
+        if args.rows:
+            load_rows(db, args.rows)
+        for name, params in CASES.items():
+            query = main.invoices_query(db, **params).limit(args.limit + 1)
+            sql = str(query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            plan = db.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}")).scalar()[0]
+            results[name] = {
+                "scans": scans(plan["Plan"]),
+                "execution_ms": plan["Execution Time"],
+            }
+    finally:
+        if args.rows:
+            db.rollback()
+            db.execute(text("DELETE FROM invoices WHERE client_name = 'benchmark' AND invoice_number LIKE 'bench\\_%'"))
+            db.commit()
+        db.close()
+
+    failures = [name for name, result in results.items()
+                if any(node == "Seq Scan" for node, _ in result["scans"])]
+    print(json.dumps({"results": results, "sequential_scans": failures}, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_()
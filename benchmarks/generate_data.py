@@ -0,0 +1,209 @@
+"""
+Bulk-load reproducible synthetic invoices and items for scale testing.
+
+Spreads --invoices invoices over the months of --years years, numbered MMYY_XXX in
+date order through invoice_sequences, so the app keeps numbering after them. Each
+invoice gets items from a fixed catalog. Most invoices have a few lines, and a 1% tail
+has 20-200 lines. Amounts and words are computed the way POST /create_invoice does.
+The same --seed on an empty database gives the same rows.
+
+Rows go in with COPY on PostgreSQL (psycopg2) and multi-row INSERTs elsewhere, in
+transactions of --batch invoices. Load into a test database that nothing else writes
+to: invoice ids are assigned from the current maximum.
+
+    python benchmarks/generate_data.py --invoices 1000000 --years 5 --seed 1
+"""
+import argparse
+import calendar
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import date
+from itertools import accumulate
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import func, insert, text
+from tqdm import tqdm
+from database import SessionLocal, init_db
+from models import Invoice, Item
+from utils import allocate_invoice_numbers, format_invoice_number, local_number_to_words
+import money
+
+INVOICE_COLUMNS = [
+    "invoice_id", "invoice_number", "client_name", "vat_number", "address", "invoice_date",
+    "subtotal_ht", "montant_tva", "timbre_price", "final_price", "final_price_in_words",
+]
+ITEM_COLUMNS = ["invoice_id", "reference", "quantity", "designation", "unit_price", "total_price"]
+
+CITIES = ["Sfax", "Tunis", "Sousse", "Gabès", "Monastir", "Nabeul", "Bizerte", "Kairouan", "Gafsa", "Médenine"]
+COMPANY_KINDS = ["SARL", "SA", "SUARL", "Ets", "Société"]
+NAMES = ["Ben Ali", "Trabelsi", "Jaziri", "Gharbi", "Chaabane", "Mansour", "Hammami", "Kammoun", "Ayari", "Zouari"]
+PRODUCTS = ["Câble", "Disjoncteur", "Tube", "Vanne", "Joint", "Moteur", "Pompe", "Raccord", "Filtre", "Relais"]
+VARIANTS = ["standard", "renforcé", "inox", "PVC", "2 pôles", "haute pression", "16 A", "DN 50", "IP65", "triphasé"]
+
+
+class Catalog:
+    # Clients and products drawn once from the seed; popular ones are picked more often (1/rank)
+    def __init__(self, rng, clients, products):
+        self.clients = [
+            (f"{rng.choice(COMPANY_KINDS)} {rng.choice(NAMES)} {n}",
+             f"{rng.randrange(10 ** 6, 10 ** 7)}/{rng.choice('ABCDEFGHJKLMNPQRSTVWXYZ')}/M/000",
+             f"Route {rng.choice(['de Tunis', 'de Gabès', 'de la Soukra', 'El Ain'])} km {rng.randint(1, 15)}, {rng.choice(CITIES)}")
+            for n in range(clients)
+        ]
+        self.products = [
+            (f"REF{n:05d}", f"{rng.choice(PRODUCTS)} {rng.choice(VARIANTS)}",
+             # Log-uniform unit prices between 0.5 and 2000 dinars, in millimes
+             round(500 * 4000 ** rng.random()))
+            for n in range(products)
+        ]
+        self.client_weights = list(accumulate(1 / rank for rank in range(1, clients + 1)))
+        self.product_weights = list(accumulate(1 / rank for rank in range(1, products + 1)))
+
+
+def item_count(rng) -> int:
+    # Mostly small invoices (median 3 lines), with a 1% tail of 20-200 line orders
+    if rng.random() < 0.01:
+        return rng.randint(20, 200)
+    return 1 + int(rng.expovariate(1 / 3))
+
+
+def month_counts(invoices: int, months: int) -> list:
+    # Invoices per month, growing linearly to twice the first month's volume
+    weights = [1 + n / max(months - 1, 1) for n in range(months)]
+    counts = [int(invoices * weight / sum(weights)) for weight in weights]
+    for n in range(invoices - sum(counts)):
+        counts[-1 - n % months] += 1
+    return counts
+
+
+def generate(rng, catalog, db, first_year, years, invoices, next_id):
+    """
+    Yield (invoice row, item rows) month by month, in date then number order.
+    Allocates each month's numbers in invoice_sequences (in the caller's transaction).
+    """
+    months = [(year, month) for year in range(first_year, first_year + years) for month in range(1, 13)]
+    for (year, month), count in zip(months, month_counts(invoices, len(months))):
+        if not count:
+            continue
+        first_number = allocate_invoice_numbers(year, month, count, db) - count + 1
+        days = sorted(rng.randint(1, calendar.monthrange(year, month)[1]) for _ in range(count))
+        for offset, day in enumerate(days):
+            client_name, vat_number, address = rng.choices(catalog.clients, cum_weights=catalog.client_weights)[0]
+            items = []
+            subtotal_ht = 0
+            for reference, designation, unit_price in rng.choices(
+                catalog.products, cum_weights=catalog.product_weights, k=item_count(rng)
+            ):
+                quantity = min(1 + int(rng.expovariate(1 / 2)), 100)
+                total_price = unit_price * quantity
+                subtotal_ht += total_price
+                items.append((next_id, reference, quantity, designation, unit_price, total_price))
+
+            montant_tva = money.percent_of(subtotal_ht, money.TVA_RATE_PERCENT)
+            final_price = subtotal_ht + montant_tva + money.TIMBRE_MILLIMES
+            yield (
+                next_id, format_invoice_number(year, month, first_number + offset),
+                client_name, vat_number, address, date(year, month, day),
+                subtotal_ht, montant_tva, money.TIMBRE_MILLIMES, final_price, local_number_to_words(final_price),
+            ), items
+            next_id += 1
+
+
+def copy_rows(cursor, table, columns, rows, amounts):
+    # COPY ... FROM STDIN of rows whose columns at the amounts positions are millimes
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        row = list(row)
+        for index in amounts:
+            row[index] = money.to_decimal(row[index])
+        writer.writerow(row)
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def insert_rows(db, model, columns, rows, amounts):
+    values = []
+    for row in rows:
+        row = list(row)
+        for index in amounts:
+            row[index] = money.to_decimal(row[index])
+        values.append(dict(zip(columns, row)))
+    db.execute(insert(model), values)
+
+
+def write_batch(db, invoices, items):
+    if db.get_bind().dialect.name == "postgresql":
+        cursor = db.connection().connection.cursor()
+        if hasattr(cursor, "copy_expert"):
+            copy_rows(cursor, "invoices", INVOICE_COLUMNS, invoices, (6, 7, 8, 9))
+            copy_rows(cursor, "items", ITEM_COLUMNS, items, (4, 5))
+            return
+    insert_rows(db, Invoice, INVOICE_COLUMNS, invoices, (6, 7, 8, 9))
+    insert_rows(db, Item, ITEM_COLUMNS, items, (4, 5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invoices", type=int, required=True)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--first-year", type=int, default=2020)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=10000, help="Invoices per transaction")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = Catalog(rng, args.clients, args.products)
+
+    init_db()
+    db = SessionLocal()
+    started = time.perf_counter()
+    total_items = 0
+    try:
+        next_id = (db.query(func.max(Invoice.invoice_id)).scalar() or 0) + 1
+        invoices, items = [], []
+        rows = generate(rng, catalog, db, args.first_year, args.years, args.invoices, next_id)
+        for invoice, invoice_items in tqdm(rows, total=args.invoices, unit="invoice"):
+            invoices.append(invoice)
+            items.extend(invoice_items)
+            if len(invoices) == args.batch:
+                write_batch(db, invoices, items)
+                db.commit()
+                total_items += len(items)
+                invoices, items = [], []
+        if invoices:
+            write_batch(db, invoices, items)
+            total_items += len(items)
+        db.commit()
+
+        if db.get_bind().dialect.name == "postgresql":
+            # Explicit ids do not move the serial; later creates must start after them
+            db.execute(text(
+                "SELECT setval(pg_get_serial_sequence('invoices', 'invoice_id'), (SELECT max(invoice_id) FROM invoices))"
+            ))
+            db.commit()
+            db.execute(text("ANALYZE invoices"))
+            db.execute(text("ANALYZE items"))
+            db.commit()
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "invoices": args.invoices,
+        "items": total_items,
+        "seconds": round(elapsed, 1),
+        "invoices_per_second": round(args.invoices / elapsed),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Concurrency benchmark for generate_invoice_number.
+
+Fires --concurrency simultaneous creates per round against DATABASE_URL, each
+allocating a number and inserting its invoice in one transaction, and reports
+collisions and allocation latency per round. The benchmark month is cleaned up
+afterwards.
+
+    python benchmarks/invoice_numbers.py --concurrency 128 --rounds 10
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from database import SQLALCHEMY_DATABASE_URL, init_db
+from models import Invoice, InvoiceSequence
+from utils import generate_invoice_number
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def create_one(Session, invoice_date, barrier):
+    db = Session()
+    try:
+        barrier.wait()
+        start = time.perf_counter()
+        invoice_number = generate_invoice_number(invoice_date.strftime("%d/%m/%Y"), db)
+        allocated = time.perf_counter()
+        db.add(Invoice(invoice_number=invoice_number, invoice_date=invoice_date, client_name="benchmark"))
+        db.commit()
+        return invoice_number, allocated - start, time.perf_counter() - start, None
+    except IntegrityError as e:
+        db.rollback()
+        return None, 0.0, 0.0, str(e.orig)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--year", type=int, default=2099, help="Year used for the benchmark invoices")
+    parser.add_argument("--month", type=int, default=1)
+    args = parser.parse_args()
+
+    init_db()
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=args.concurrency, max_overflow=0)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    invoice_date = date(args.year, args.month, 1)
+
+    numbers = []
+    errors = []
+    rounds = []
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for round_number in range(args.rounds):
+                barrier = threading.Barrier(args.concurrency)
+                started = time.perf_counter()
+                results = list(pool.map(
+                    lambda _: create_one(Session, invoice_date, barrier), range(args.concurrency)
+                ))
+                elapsed = time.perf_counter() - started
+
+                allocations = [r[1] for r in results if r[0]]
+                totals = [r[2] for r in results if r[0]]
+                numbers.extend(r[0] for r in results if r[0])
+                errors.extend(r[3] for r in results if r[3])
+                rounds.append({
+                    "round": round_number + 1,
+                    "creates_per_second": round(len(totals) / elapsed, 1),
+                    "allocation_ms_p50": round(statistics.median(allocations) * 1000, 3) if allocations else None,
+                    "allocation_ms_p99": round(percentile(allocations, 99) * 1000, 3) if allocations else None,
+                    "create_ms_p99": round(percentile(totals, 99) * 1000, 3) if totals else None,
+                })
+    finally:
+        db = Session()
+        db.query(Invoice).filter(Invoice.invoice_date == invoice_date, Invoice.client_name == "benchmark").delete()
+        db.query(InvoiceSequence).filter(
+            InvoiceSequence.year == args.year, InvoiceSequence.month == args.month
+        ).delete()
+        db.commit()
+        db.close()
+
+    print(json.dumps({
+        "database": engine.dialect.name,
+        "concurrency": args.concurrency,
+        "creates": len(numbers),
+        "duplicate_numbers": len(numbers) - len(set(numbers)),
+        "failed_creates": len(errors),
+        "rounds": rounds,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
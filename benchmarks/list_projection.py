@@ -0,0 +1,109 @@
+"""
+Per-row CPU and memory of GET /invoices with full Invoice entities vs column projections.
+
+Loads --rows synthetic invoices dated 2099, then fetches them all with the same
+filter and ordering twice: once as db.query(Invoice) ORM objects (the old list
+query), once through main.invoices_query (INVOICE_LIST_COLUMNS row tuples). Each
+row is turned into its response dict with main.invoice_row. Reports the best
+wall time and the tracemalloc peak of each mode. The synthetic rows are deleted
+afterwards.
+
+    python benchmarks/list_projection.py --rows 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert
+from database import SessionLocal
+from models import Invoice
+import main
+
+YEAR = 2099
+
+
+def load_rows(db, rows):
+    start = date(YEAR, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append({
+            "invoice_number": f"bench_{i}",
+            "client_name": "benchmark",
+            "vat_number": "0000000/A/M/000",
+            "address": "Route de Tunis km 4, Sfax",
+            "invoice_date": start + timedelta(days=i % 365),
+            "subtotal_ht": 100,
+            "montant_tva": 7,
+            "timbre_price": 1,
+            "final_price": 108,
+            "final_price_in_words": "Cent huit dinars",
+        })
+        if len(batch) == 5000:
+            db.execute(insert(Invoice), batch)
+            batch = []
+    if batch:
+        db.execute(insert(Invoice), batch)
+    db.commit()
+
+
+def entity_rows(db):
+    query = db.query(Invoice).filter(
+        Invoice.invoice_date >= date(YEAR, 1, 1), Invoice.invoice_date < date(YEAR + 1, 1, 1)
+    ).order_by(Invoice.invoice_date, Invoice.invoice_number)
+    return [main.invoice_row(invoice) for invoice in query.all()]
+
+
+def projected_rows(db):
+    return [main.invoice_row(row) for row in main.invoices_query(db, year=YEAR).all()]
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        db = SessionLocal()
+        gc.collect()
+        start = time.perf_counter()
+        rows = fn(db)
+        elapsed = time.perf_counter() - start
+        db.close()
+        best = elapsed if best is None else min(best, elapsed)
+
+    # Separate run for memory, tracemalloc slows allocation down
+    db = SessionLocal()
+    gc.collect()
+    tracemalloc.start()
+    rows = fn(db)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.close()
+    return len(rows), best, peak
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        load_rows(db, args.rows)
+        for name, fn in (("entities", entity_rows), ("projection", projected_rows)):
+            count, best, peak = measure(fn, args.repeat)
+            print(f"{name:<11} {count} rows  {best:.3f} s  {best / count * 1e6:.2f} us/row  "
+                  f"peak {peak / 2**20:.1f} MiB  {peak / count:.0f} B/row")
+    finally:
+        db.rollback()
+        db.query(Invoice).filter(Invoice.client_name == "benchmark").delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main_()
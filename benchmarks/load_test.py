@@ -0,0 +1,267 @@
+"""
+HTTP load test of the invoice endpoints, comparing the sync (threadpool) and
+async (DATABASE_ASYNC) database paths.
+
+Starts the app with uvicorn once per mode, drives a mix of create / list / details /
+delete requests with httpx, and prints throughput and p50 / p95 / p99 latency per
+operation as JSON. --output keeps the JSON for benchmarks/compare.py.
+
+The app runs against DATABASE_URL, or a throwaway SQLite file with --database sqlite.
+Both modes run by default, only sync on SQLite (async SQLite needs aiosqlite).
+Words use the local engine unless --llm-latency is given: the "openai" engine then
+talks to benchmarks/stub_llm.py, which answers after that many milliseconds.
+
+    python benchmarks/load_test.py --concurrency 64 --requests 5000
+    python benchmarks/load_test.py --database sqlite --llm-latency 300 --output before.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from stub_llm import start_stub
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def invoice_request(rng, year, month):
+    return {
+        "client_name": "benchmark",
+        "vat_number": "0000000/A/M/000",
+        "address": "Sfax",
+        "invoice_date": f"{rng.randint(1, 28):02d}/{month:02d}/{year}",
+        "items": [
+            {
+                "reference": f"REF{n:04d}",
+                "quantity": rng.randint(1, 10),
+                "designation": f"Article {n}",
+                "unit_price": round(rng.uniform(1, 500), 3),
+            }
+            for n in range(rng.randint(1, 10))
+        ],
+    }
+
+
+def start_server(env, port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--timeout-keep-alive", "60"],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/amount_words_cache", timeout=1)
+            return process
+        except httpx.HTTPError:
+            if process.poll() is not None:
+                raise RuntimeError("The server exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("The server did not start")
+
+
+async def run_workload(base_url, args):
+    rng = random.Random(args.seed)
+    latencies = {operation: [] for operation in args.mix}
+    errors = {operation: 0 for operation in args.mix}
+    operations = [op for op, weight in args.mix.items() for _ in range(weight)]
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+        # Invoices for the details / delete requests to target
+        numbers = []
+        for _ in range(args.warmup):
+            response = await client.post("/create_invoice", json=invoice_request(rng, args.year, args.month))
+            numbers.append(response.json()["invoice_number"])
+
+        async def request(operation):
+            if operation == "create":
+                response = await client.post("/create_invoice", json=invoice_request(rng, args.year, args.month))
+                if response.status_code == 200:
+                    numbers.append(response.json()["invoice_number"])
+                return response
+            if operation == "list":
+                return await client.get("/invoices", params={"year": args.year, "month": args.month})
+            if operation == "details":
+                return await client.get("/invoice_details", params={"invoice_number": rng.choice(numbers)})
+            if operation == "delete":
+                return await client.delete("/delete_invoice", params={"invoice_number": numbers.pop()})
+            raise ValueError(operation)
+
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(rng.choice(operations))
+
+        async def worker():
+            while not queue.empty():
+                operation = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    response = await request(operation)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies[operation].append(time.perf_counter() - start)
+                errors[operation] += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": args.requests,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "operations": {
+            operation: {
+                "count": len(values),
+                "errors": errors[operation],
+                "p50_ms": round(statistics.median(values) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+            }
+            for operation, values in latencies.items()
+            if values
+        },
+    }
+
+
+def cleanup(year, month):
+    from database import SessionLocal
+    from models import Invoice, Item, InvoiceSequence
+
+    db = SessionLocal()
+    invoice_ids = db.query(Invoice.invoice_id).filter(Invoice.client_name == "benchmark")
+    db.query(Item).filter(Item.invoice_id.in_(invoice_ids)).delete(synchronize_session=False)
+    db.query(Invoice).filter(Invoice.client_name == "benchmark").delete(synchronize_session=False)
+    db.query(InvoiceSequence).filter(InvoiceSequence.year == year, InvoiceSequence.month == month).delete()
+    db.commit()
+    db.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        operation, weight = part.split("=")
+        mix[operation] = int(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--modes", nargs="+", choices=["sync", "async"],
+                        help="Database modes to run (default: sync async, sync only on SQLite)")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=50, help="Invoices created before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("create=1,list=2,details=7"),
+                        help="Weighted operations, e.g. create=1,list=2,details=7,delete=1")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--year", type=int, default=2099, help="Year used for the benchmark invoices")
+    parser.add_argument("--month", type=int, default=3)
+    parser.add_argument("--database", help='SQLAlchemy URL, or "sqlite" for a throwaway SQLite file (default: DATABASE_URL)')
+    parser.add_argument("--llm-latency", type=float,
+                        help="Use the openai words engine against the stub LLM, answering after this many ms")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.database == "sqlite":
+        workdir = tempfile.mkdtemp(prefix="elkolla-benchmark-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    elif args.database:
+        os.environ["DATABASE_URL"] = args.database
+    if not os.environ.get("DATABASE_URL"):
+        parser.error("set DATABASE_URL or pass --database")
+    sqlite = os.environ["DATABASE_URL"].startswith("sqlite")
+    if args.modes is None:
+        args.modes = ["sync"] if sqlite else ["sync", "async"]
+    if sqlite and "async" in args.modes and importlib.util.find_spec("aiosqlite") is None:
+        parser.error("the async mode on SQLite needs aiosqlite (pip install aiosqlite)")
+
+    # Never reach the real OpenAI API from a benchmark
+    env = dict(os.environ, NUMBER_TO_WORDS_ENGINE="local")
+    llm = None
+    if args.llm_latency is not None:
+        llm = start_stub(args.llm_latency)
+        env.update(
+            NUMBER_TO_WORDS_ENGINE="openai",
+            OPENAI_BASE_URL=f"http://127.0.0.1:{llm.server_port}/v1",
+            OPENAI_API_KEY="stub",
+        )
+
+    results = {}
+    try:
+        for mode in args.modes:
+            port = free_port()
+            server = start_server(dict(env, DATABASE_ASYNC="true" if mode == "async" else "false"), port)
+            llm_calls = llm.requests if llm else 0
+            try:
+                results[mode] = asyncio.run(run_workload(f"http://127.0.0.1:{port}", args))
+            finally:
+                server.terminate()
+                server.wait()
+            if llm:
+                results[mode]["llm_calls"] = llm.requests - llm_calls
+    finally:
+        if workdir:
+            shutil.rmtree(workdir)
+        else:
+            cleanup(args.year, args.month)
+        if llm:
+            llm.shutdown()
+
+    output = json.dumps({
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+        "llm_latency_ms": args.llm_latency,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "mix": args.mix,
+        "seed": args.seed,
+        "results": results,
+    }, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
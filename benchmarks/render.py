@@ -0,0 +1,109 @@
+"""
+Warm per-invoice render time of invoice PDFs with and without the rendering caches.
+
+"uncached" renders the way every request did before the caches: the Jinja2 template
+compiled again, invoice.css parsed again, a new font configuration and the full-size
+form/images/logo.png. "cached" is rendering.render_invoice_pdf: precompiled template,
+stylesheet and fonts parsed once, and the pre-resized logo as a data URI. Each mode
+renders once before timing. Without WeasyPrint (Pango missing), only the HTML and
+logo decoding stages are measured.
+
+    python benchmarks/render.py --items 20 --repeat 20
+"""
+import argparse
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from PIL import Image
+import rendering
+
+
+def sample_invoice(items):
+    return {
+        "invoice_number": "1224_001",
+        "client_name": "Client SARL",
+        "vat_number": "1234567/A/M/000",
+        "address": "Route de Tunis km 4, Sfax",
+        "invoice_date": "01/12/2024",
+        "subtotal_ht": 1234.5,
+        "montant_tva": 86.415,
+        "timbre_price": 1.0,
+        "final_price": 1321.915,
+        "final_price_in_words": "Mille trois cent vingt et un dinars et neuf cent quinze millimes",
+        "words_pending": False,
+        "items": [
+            {"reference": f"REF-{i}", "quantity": 2, "designation": f"Article {i}", "unit_price": 2.469, "total_price": 4.938}
+            for i in range(items)
+        ],
+    }
+
+
+def uncached_html(invoice):
+    env = Environment(loader=FileSystemLoader(rendering.TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+    env.filters["amount"] = rendering.format_amount
+    return env.get_template("invoice.html").render(invoice=invoice, logo_src="images/logo.png")
+
+
+def uncached_pdf(invoice):
+    weasyprint = rendering.load_weasyprint()
+    from weasyprint.text.fonts import FontConfiguration
+    font_config = FontConfiguration()
+    stylesheet = weasyprint.CSS(string=rendering.INVOICE_CSS, font_config=font_config)
+    return weasyprint.HTML(string=uncached_html(invoice), base_url=rendering.ASSETS_DIR).write_pdf(
+        stylesheets=[stylesheet], font_config=font_config
+    )
+
+
+def full_logo_decode(invoice):
+    with Image.open(rendering.LOGO_PATH) as image:
+        image.load()
+
+
+def resized_logo_decode(invoice):
+    data = base64.b64decode(rendering.logo_data_uri().split(",", 1)[1])
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+
+
+def measure(fn, invoice, repeat):
+    fn(invoice)  # warm-up
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(invoice)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    invoice = sample_invoice(args.items)
+    stages = {
+        "html": (uncached_html, rendering.render_invoice_html),
+        "logo decode": (full_logo_decode, resized_logo_decode),
+    }
+    try:
+        rendering.load_weasyprint()
+        stages["pdf"] = (uncached_pdf, rendering.render_invoice_pdf)
+    except RuntimeError as e:
+        print(f"pdf: skipped ({e})")
+
+    for stage, (uncached, cached) in stages.items():
+        before = measure(uncached, invoice, args.repeat)
+        after = measure(cached, invoice, args.repeat)
+        print(f"{stage:<12} uncached {before * 1000:8.2f} ms  cached {after * 1000:8.2f} ms  x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Serialization microbenchmark of the invoice detail and list payloads.
+
+Builds an invoice detail with --items lines and an /invoices page of --rows rows
+in memory (no database), then times rendering them the old way (pydantic
+response models + jsonable_encoder + JSONResponse with the stdlib json module)
+and the way main.py does it now (plain dicts rendered by orjson).
+
+    python benchmarks/serialization.py --items 500 --rows 10000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+import orjson
+import main
+from utils import invoice_detail
+
+
+def detail_models(invoice, items):
+    return main.InvoiceDetailResponse(
+        invoice_number=invoice.invoice_number,
+        client_name=invoice.client_name,
+        vat_number=invoice.vat_number,
+        address=invoice.address,
+        invoice_date=invoice.invoice_date.strftime("%d/%m/%Y"),
+        subtotal_ht=float(invoice.subtotal_ht),
+        montant_tva=float(invoice.montant_tva),
+        timbre_price=float(invoice.timbre_price),
+        final_price=float(invoice.final_price),
+        final_price_in_words=invoice.final_price_in_words,
+        words_pending=invoice.final_price_in_words is None,
+        items=[main.ItemResponse(
+            reference=item.reference,
+            quantity=item.quantity,
+            designation=item.designation,
+            unit_price=float(item.unit_price),
+            total_price=float(item.total_price),
+        ) for item in items]
+    )
+
+
+def list_models(rows):
+    return [main.InvoiceResponse(**main.invoice_row(row)) for row in rows]
+
+
+CASES = {
+    "detail": {
+        "json": lambda invoice, items, rows: JSONResponse(jsonable_encoder(detail_models(invoice, items))).body,
+        "orjson": lambda invoice, items, rows: orjson.dumps(invoice_detail(invoice, items)),
+    },
+    "list": {
+        "json": lambda invoice, items, rows: JSONResponse(jsonable_encoder(list_models(rows))).body,
+        "orjson": lambda invoice, items, rows:
+            b"[" + b",".join(orjson.dumps(main.invoice_row(row)) for row in rows) + b"]",
+    },
+}
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    invoice = SimpleNamespace(
+        invoice_number="1224_001", client_name="Client SARL", vat_number="1234567/A/M/000",
+        address="Route de Tunis km 4, Sfax", invoice_date=date(2024, 12, 1),
+        subtotal_ht=Decimal("1234.500"), montant_tva=Decimal("86.415"), timbre_price=Decimal("1.000"),
+        final_price=Decimal("1321.915"),
+        final_price_in_words="Mille trois cent vingt et un dinars et neuf cent quinze millimes",
+    )
+    items = [
+        SimpleNamespace(reference=f"REF-{i}", quantity=i % 7 + 1, designation=f"Article {i}",
+                        unit_price=Decimal("2.469"), total_price=Decimal("4.938"))
+        for i in range(args.items)
+    ]
+    rows = [
+        SimpleNamespace(invoice_number=f"1224_{i:03d}", subtotal_ht=Decimal("100.000"), montant_tva=Decimal("7.000"),
+                        timbre_price=Decimal("1.000"), final_price=Decimal("108.000"),
+                        final_price_in_words="Cent huit dinars")
+        for i in range(args.rows)
+    ]
+
+    for case, renderers in CASES.items():
+        bodies = {name: render(invoice, items, rows) for name, render in renderers.items()}
+        if orjson.loads(bodies["json"]) != orjson.loads(bodies["orjson"]):
+            sys.exit(f"{case}: renderers disagree")
+        times = {name: best_of(lambda: render(invoice, items, rows), args.repeat)
+                 for name, render in renderers.items()}
+        print(f"{case:<7} " + "  ".join(f"{name} {elapsed * 1000:.2f} ms" for name, elapsed in times.items())
+              + f"  speedup x{times['json'] / times['orjson']:.1f}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,83 @@
+"""
+Stub of the OpenAI chat completions API answering after a fixed latency.
+
+Lets the "openai" words engine be benchmarked without network access or an API key.
+It answers POST /v1/chat/completions with the amount of the prompt in figures, after
+--latency milliseconds. Run it on its own and point the app at it:
+
+    python benchmarks/stub_llm.py --port 8900 --latency 300
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=stub NUMBER_TO_WORDS_ENGINE=openai uvicorn main:app
+
+benchmarks/load_test.py starts it in-process with --llm-latency.
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# number_to_words ends its prompt with the amount as <dinars>.<millimes>
+AMOUNT = re.compile(r"(\d+)\.(\d{3})\s*$")
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        time.sleep(self.server.latency)
+
+        match = AMOUNT.search(request["messages"][-1]["content"])
+        content = f"{int(match[1])} dinars et {int(match[2])} millimes" if match else "Montant inconnu"
+        body = json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode()
+
+        with self.server.lock:
+            self.server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(latency_ms: float, port: int = 0) -> ThreadingHTTPServer:
+    """
+    Serve the stub from a daemon thread. server.requests counts the completions served.
+    - port: int -> Port to listen on, 0 for a free one (read it from server.server_port).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=300, help="Milliseconds before each answer")
+    args = parser.parse_args()
+
+    server = start_stub(args.latency, args.port)
+    print(f"Stub LLM on http://127.0.0.1:{server.server_port}/v1 ({args.latency:g} ms per completion)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
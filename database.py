@@ -1,16 +1,125 @@
+import asyncio
 import os
+import uuid
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool, QueuePool
 from dotenv import load_dotenv
+from metrics import TimedQueuePool, TimedAsyncAdaptedQueuePool, TimedReplicaQueuePool, TimedAsyncReplicaQueuePool
 load_dotenv()
 # Use environment variables for database credentials
 SQLALCHEMY_DATABASE_URL = os.getenv('DATABASE_URL')
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Connection pool of each engine (the async one has its own with the same settings)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+# Seconds a request waits for a free connection before failing with 503
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Connections older than this many seconds are replaced (-1 keeps them forever)
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# Test each connection on checkout, so connections broken by a failover are replaced
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+# Connections opened at startup (default: the pool size)
+DB_POOL_WARMUP = int(os.getenv('DB_POOL_WARMUP', str(DB_POOL_SIZE)))
+# Behind PgBouncer in transaction mode: no pool of our own and no prepared statements
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+def engine_options(poolclass, connect_args=None) -> dict:
+    """
+    create_engine keyword arguments of the pool settings above.
+    - poolclass: QueuePool subclass used outside PgBouncer mode.
+    - connect_args: dict -> Driver arguments needed in PgBouncer mode.
+    """
+    if DB_PGBOUNCER:
+        return {'poolclass': NullPool, 'connect_args': connect_args or {}}
+    return {
+        'poolclass': poolclass,
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+# Pools time their checkouts for /metrics
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(TimedQueuePool))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional read replica serving the GET endpoints; writes always go to DATABASE_URL
+DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+# Seconds a client reads from the primary after one of its writes, so it sees that write
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+
+replica_engine = None
+ReplicaSessionLocal = SessionLocal
+if DATABASE_REPLICA_URL:
+    replica_engine = create_engine(DATABASE_REPLICA_URL, **engine_options(TimedReplicaQueuePool))
+    ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
+# Serve the API endpoints through an asyncio engine (asyncpg) instead of the threadpool
+DATABASE_ASYNC = os.getenv('DATABASE_ASYNC', 'false').lower() == 'true'
+
+def async_database_url(url: str) -> str:
+    # postgresql://... or postgresql+psycopg2://... -> postgresql+asyncpg://...
+    scheme, rest = url.split('://', 1)
+    if scheme.startswith('postgres'):
+        return f'postgresql+asyncpg://{rest}'
+    if scheme.startswith('sqlite'):
+        return f'sqlite+aiosqlite://{rest}'
+    return url
+
+ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+# asyncpg prepares every statement; PgBouncer may run the next one on another server connection
+PGBOUNCER_ASYNCPG_ARGS = {
+    'statement_cache_size': 0,
+    'prepared_statement_cache_size': 0,
+    'prepared_statement_name_func': lambda: f'__asyncpg_{uuid.uuid4()}__',
+}
+
+async_engine = None
+AsyncSessionLocal = None
+async_replica_engine = None
+AsyncReplicaSessionLocal = None
+if DATABASE_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL, **engine_options(TimedAsyncAdaptedQueuePool, PGBOUNCER_ASYNCPG_ARGS)
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autocommit=False, autoflush=False)
+    AsyncReplicaSessionLocal = AsyncSessionLocal
+    if DATABASE_REPLICA_URL:
+        async_replica_engine = create_async_engine(
+            os.getenv('ASYNC_DATABASE_REPLICA_URL') or async_database_url(DATABASE_REPLICA_URL),
+            **engine_options(TimedAsyncReplicaQueuePool, PGBOUNCER_ASYNCPG_ARGS),
+        )
+        AsyncReplicaSessionLocal = async_sessionmaker(async_replica_engine, autocommit=False, autoflush=False)
+
 Base = declarative_base()
 
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add the indexes declared after they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def warm_up_pool():
+    # Fill the pools before the first requests, so that they skip connection setup
+    for pool_engine in (engine, replica_engine):
+        if pool_engine is None or not isinstance(pool_engine.pool, QueuePool):
+            continue
+        connections = [pool_engine.connect() for _ in range(min(DB_POOL_WARMUP, DB_POOL_SIZE))]
+        for connection in connections:
+            connection.close()
+
+async def warm_up_async_pool():
+    for pool_engine in (async_engine, async_replica_engine):
+        if pool_engine is None or not isinstance(pool_engine.pool, QueuePool):
+            continue
+        connections = await asyncio.gather(
+            *(pool_engine.connect() for _ in range(min(DB_POOL_WARMUP, DB_POOL_SIZE)))
+        )
+        for connection in connections:
+            await connection.close()
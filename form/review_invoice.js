@@ -48,6 +48,9 @@ document.addEventListener("DOMContentLoaded", () => {
     
             if (response.ok) {
                 const result = await response.json();
+                // Read the new invoice from the primary database on the next page, see invoices.html
+                const readPrimaryUntil = response.headers.get("X-Read-Primary-Until");
+                if (readPrimaryUntil) localStorage.setItem("readPrimaryUntil", readPrimaryUntil);
                 alert("Invoice successfully created! Invoice Number: " + result.invoice_number);
                 localStorage.removeItem("invoiceData");
                 window.location.href = "invoices.html";
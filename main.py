@@ -1,22 +1,68 @@
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from models import Invoice, Item
-from database import SessionLocal, init_db
-from pydantic import BaseModel
-from utils import number_to_words, generate_invoice_number
-from datetime import datetime
-from typing import List, Optional
-from fastapi.responses import JSONResponse
-from fastapi import FastAPI, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import engine, async_engine, SessionLocal, AsyncSessionLocal, DATABASE_ASYNC, init_db
+from database import replica_engine, async_replica_engine, ReplicaSessionLocal, AsyncReplicaSessionLocal
+import database
+from pydantic import BaseModel, Field
+from pydantic import ValidationError
+from utils import (
+    number_to_words, numbers_to_words, generate_invoice_number, allocate_invoice_numbers, format_invoice_number,
+    seed_invoice_sequences, amount_words_cache, invoice_details_cache, encode_cursor, decode_cursor,
+    invoice_detail, merge_invoice_details,
+)
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Union
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, or_, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
 from sqlalchemy.sql import func
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+import hashlib
+import tempfile
+import time
+import orjson
+import archive
+import metrics
+import money
+import rendering
+import timing
+from timing import phase
+import words_worker
 
 
-app = FastAPI()
-
 # Initialize the database
 init_db()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Start the per-month invoice counters from the existing invoices
+    db = SessionLocal()
+    try:
+        seed_invoice_sequences(db)
+    finally:
+        db.close()
+
+    # Finish any words left pending by a previous run
+    words_worker.resume_pending_words()
+
+    # Resize the logo, parse the invoice stylesheet and fonts before the first PDF request
+    await run_in_threadpool(rendering.warm_up)
+
+    # Open the pooled connections now rather than on the first requests after a deploy
+    await run_in_threadpool(database.warm_up_pool)
+    await database.warm_up_async_pool()
+    yield
+    words_worker.shutdown()
+    archive.shutdown()
+
+# orjson renders every JSON response instead of the stdlib json module
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
 # Allow all origins for testing
 app.add_middleware(
     CORSMiddleware,
@@ -24,8 +70,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Invoice-Count", "Server-Timing", "X-Read-Primary-Until"],
 )
 
+# Server-Timing header and timing logs, only installed when SERVER_TIMING is on
+if timing.SERVER_TIMING:
+    timing.instrument_engine(engine)
+    if async_engine is not None:
+        timing.instrument_engine(async_engine.sync_engine)
+    if replica_engine is not None:
+        timing.instrument_engine(replica_engine)
+    if async_replica_engine is not None:
+        timing.instrument_engine(async_replica_engine.sync_engine)
+    app.add_middleware(timing.ServerTimingMiddleware)
+
+# Prometheus metrics, always on and served by GET /metrics
+metrics.instrument_engine(engine, "sync")
+if async_engine is not None:
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+if replica_engine is not None:
+    metrics.instrument_engine(replica_engine, "replica")
+if async_replica_engine is not None:
+    metrics.instrument_engine(async_replica_engine.sync_engine, "async_replica")
+app.add_middleware(metrics.MetricsMiddleware)
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    # No connection freed up within DB_POOL_TIMEOUT: ask the client to retry rather than a 500
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
 # Define the response models first
 class ItemResponse(BaseModel):
     reference: str
@@ -40,7 +117,8 @@ class InvoiceResponse(BaseModel):
     montant_tva: float
     timbre_price: float
     final_price: float
-    final_price_in_words: str
+    final_price_in_words: Optional[str]
+    words_pending: bool = False
 
 class InvoiceDetailResponse(BaseModel):
     invoice_number: str
@@ -52,15 +130,22 @@ class InvoiceDetailResponse(BaseModel):
     montant_tva: float
     timbre_price: float
     final_price: float
-    final_price_in_words: str
+    final_price_in_words: Optional[str]
+    words_pending: bool = False
     items: List[ItemResponse]
 
+class InvoiceWordsResponse(BaseModel):
+    invoice_number: str
+    final_price_in_words: Optional[str]
+    words_pending: bool
+
 # Define request models
 class ItemRequest(BaseModel):
     reference: str
     quantity: int
     designation: str
-    unit_price: float
+    # "1e400" would parse as inf, which has no millime value; larger prices do not fit NUMERIC(14, 3)
+    unit_price: float = Field(allow_inf_nan=False, gt=-money.MAX_DINARS, lt=money.MAX_DINARS)
 
 class InvoiceRequest(BaseModel):
     client_name: str
@@ -69,6 +154,10 @@ class InvoiceRequest(BaseModel):
     invoice_date: str
     items: list[ItemRequest]
 
+class InvoiceDetailsBatchRequest(BaseModel):
+    invoice_numbers: List[str] = []
+    invoice_ids: List[int] = []
+
 # Dependency for getting the database session
 def get_db():
     db = SessionLocal()
@@ -77,121 +166,539 @@ def get_db():
     finally:
         db.close()
 
-@app.post("/create_invoice", response_model=InvoiceResponse)
-def create_invoice(invoice_request: InvoiceRequest, db: Session = Depends(get_db)):
+# Dependency for the invoice endpoints: an AsyncSession when DATABASE_ASYNC is set
+if DATABASE_ASYNC:
+    async def get_session():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    get_session = get_db
+
+# Set on write responses: the client reads from the primary while it sends back the cookie,
+# or the header (for cross-origin and cookie-less clients) until the time it holds
+READ_PRIMARY_COOKIE = "elkolla_read_primary"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+
+def reads_from_primary(request: Request) -> bool:
+    if READ_PRIMARY_COOKIE in request.cookies:
+        return True
+    try:
+        return float(request.headers.get(READ_PRIMARY_HEADER, 0)) > time.time()
+    except ValueError:
+        return False
+
+def read_sessionmaker(request: Request):
+    # The primary for a client that just wrote, the read replica (if any) otherwise
+    if reads_from_primary(request):
+        return SessionLocal
+    return ReplicaSessionLocal
+
+def get_read_db(request: Request):
+    db = read_sessionmaker(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for the read endpoints: get_session, on DATABASE_REPLICA_URL when it is set
+if DATABASE_ASYNC:
+    async def get_read_session(request: Request):
+        factory = AsyncSessionLocal if reads_from_primary(request) else AsyncReplicaSessionLocal
+        async with factory() as db:
+            yield db
+else:
+    get_read_session = get_read_db
+
+def pin_to_primary(response: Response):
+    # Read-your-writes: send the client's reads to the primary until the replica has caught up
+    if replica_engine is not None:
+        response.set_cookie(
+            READ_PRIMARY_COOKIE, "1", max_age=database.DB_REPLICA_PIN_SECONDS, httponly=True, samesite="lax"
+        )
+        response.headers[READ_PRIMARY_HEADER] = str(int(time.time()) + database.DB_REPLICA_PIN_SECONDS)
+
+async def run_db(db: Union[Session, AsyncSession], fn, *args):
+    """
+    Run fn(session, *args): in the threadpool for a plain Session, or through the
+    greenlet bridge of an AsyncSession. The bridge runs fn on the event loop thread and
+    only its database I/O yields, so fn must not block otherwise (engine calls, files).
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+def etag_for(body: bytes) -> str:
+    # Strong ETag: hash of the exact response body
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def conditional_response(request: Request, body: bytes, etag: str, headers: Optional[dict] = None) -> Response:
+    """
+    JSON response carrying its ETag, or 304 Not Modified when If-None-Match already has it.
+    Cache-Control: no-cache makes clients revalidate, so a deleted invoice is not served from their cache.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache", **(headers or {})}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def invoice_values(invoice_request: InvoiceRequest):
+    """
+    Compute the header columns (without invoice_number and final_price_in_words)
+    and the item rows (without invoice_id) of an invoice request.
+    """
     # Convert invoice_date from string to datetime.date
     invoice_date_obj = datetime.strptime(invoice_request.invoice_date, "%d/%m/%Y").date()
 
+    # All amounts below are integer millimes, see money.py
+    item_totals = [money.to_millimes(item.unit_price) * item.quantity for item in invoice_request.items]
+
     # 1. Calculate Subtotal HT
-    subtotal_ht = sum(item.unit_price * item.quantity for item in invoice_request.items)
+    subtotal_ht = sum(item_totals)
 
     # 2. Calculate Montant TVA (7%)
-    montant_tva = subtotal_ht * 0.07
+    montant_tva = money.percent_of(subtotal_ht, money.TVA_RATE_PERCENT)
 
-    # 3. Fixed Timbre price (1 dinar, formatted to 3 decimal places)
-    timbre_price = 1.000
+    # 3. Fixed Timbre price (1 dinar)
+    timbre_price = money.TIMBRE_MILLIMES
 
     # 4. Final price
     final_price = subtotal_ht + montant_tva + timbre_price
+    # unit_price is bounded by ItemRequest, but quantities can still push the totals out of NUMERIC(14, 3)
+    if max(abs(subtotal_ht), abs(final_price)) >= money.MAX_DINARS * money.MILLIMES_PER_DINAR:
+        raise ValueError("Invalid amount: the invoice total is too large.")
 
-    # Round values to 3 decimal places and format with commas
-    subtotal_ht = f"{subtotal_ht:,.3f}"
-    montant_tva = f"{montant_tva:,.3f}"
-    timbre_price = f"{timbre_price:,.3f}"
-    final_price = f"{final_price:,.3f}"
-
-    # 5. Generate invoice number (MMYY_XXX)
-    invoice_number = generate_invoice_number(invoice_request.invoice_date, db)
-
-    # 6. Convert final price to words
-    final_price_in_words = number_to_words(float(final_price.replace(',', '')))
-
-    # 7. Create invoice record in the database
-    invoice = Invoice(
-        client_name=invoice_request.client_name,
-        vat_number=invoice_request.vat_number,
-        address=invoice_request.address,
-        invoice_date=invoice_date_obj,  # Use the converted date object here
-        invoice_number=invoice_number,
-        subtotal_ht=float(subtotal_ht.replace(',', '')),
-        montant_tva=float(montant_tva.replace(',', '')),
-        timbre_price=float(timbre_price.replace(',', '')),
-        final_price=float(final_price.replace(',', '')),
-        final_price_in_words=final_price_in_words
-    )
-    
-    db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
-
-    # Create item records and link them to the invoice
-    for item in invoice_request.items:
-        db_item = Item(
-            invoice_id=invoice.invoice_id,
-            reference=item.reference,
-            quantity=item.quantity,
-            designation=item.designation,
-            unit_price=item.unit_price,
-            total_price=float(f"{item.unit_price * item.quantity:,.3f}".replace(',', ''))  # Format total_price
-        )
-        db.add(db_item)
-    
-    db.commit()
+    header = {
+        "client_name": invoice_request.client_name,
+        "vat_number": invoice_request.vat_number,
+        "address": invoice_request.address,
+        "invoice_date": invoice_date_obj,  # Use the converted date object here
+        "subtotal_ht": money.to_decimal(subtotal_ht),
+        "montant_tva": money.to_decimal(montant_tva),
+        "timbre_price": money.to_decimal(timbre_price),
+        "final_price": money.to_decimal(final_price),
+    }
+    items = [
+        {
+            "reference": item.reference,
+            "quantity": item.quantity,
+            "designation": item.designation,
+            "unit_price": money.to_decimal(money.to_millimes(item.unit_price)),
+            "total_price": money.to_decimal(total_price),
+        }
+        for item, total_price in zip(invoice_request.items, item_totals)
+    ]
+    return header, items
 
+def invoice_response(header: dict) -> InvoiceResponse:
     return InvoiceResponse(
-        invoice_number=invoice_number,
-        subtotal_ht=float(subtotal_ht.replace(',', '')),
-        montant_tva=float(montant_tva.replace(',', '')),
-        timbre_price=float(timbre_price.replace(',', '')),
-        final_price=float(final_price.replace(',', '')),
-        final_price_in_words=final_price_in_words
+        invoice_number=header["invoice_number"],
+        subtotal_ht=float(header["subtotal_ht"]),
+        montant_tva=float(header["montant_tva"]),
+        timbre_price=float(header["timbre_price"]),
+        final_price=float(header["final_price"]),
+        final_price_in_words=header["final_price_in_words"],
+        words_pending=header["final_price_in_words"] is None
     )
 
+def final_price_words(db: Session, final_price) -> Optional[str]:
+    # None when the background worker fills the words after commit
+    if words_worker.WORDS_ASYNC:
+        return None
+    with phase("words"):
+        return number_to_words(final_price, db)
 
-@app.get("/invoices", response_model=List[InvoiceResponse])
-def get_invoices(
+def words_in_own_session(final_price) -> Optional[str]:
+    # final_price_words for async sessions, run in the threadpool with its own sync session
+    db = SessionLocal()
+    try:
+        words = final_price_words(db, final_price)
+        db.commit()
+        return words
+    finally:
+        db.close()
+
+def _create_invoice(db: Session, invoice_request: InvoiceRequest, header: dict, items: list) -> InvoiceResponse:
+    # 5. Convert final price to words, unless a background worker fills them after commit.
+    # Done before the number: its counter row stays locked until commit, and an engine
+    # call (OpenAI) must not hold up the other creates of the month.
+    if "final_price_in_words" not in header:
+        header["final_price_in_words"] = final_price_words(db, header["final_price"])
+
+    # 6. Generate invoice number (MMYY_XXX)
+    with phase("invoice_number"):
+        header["invoice_number"] = generate_invoice_number(invoice_request.invoice_date, db)
+
+    # 7. Create invoice record in the database and get its invoice_id back (INSERT ... RETURNING)
+    invoice_id = db.execute(
+        insert(Invoice).values(**header).returning(Invoice.invoice_id)
+    ).scalar_one()
+
+    # Insert all items with a single executemany, in the same transaction as the header
+    if items:
+        db.execute(insert(Item), [{**item, "invoice_id": invoice_id} for item in items])
+
+    with phase("commit"):
+        db.commit()
+
+    if header["final_price_in_words"] is None:
+        words_worker.submit_words(invoice_id, header["final_price"])
+
+    return invoice_response(header)
+
+@app.post("/create_invoice", response_model=InvoiceResponse)
+async def create_invoice(
+    invoice_request: InvoiceRequest,
+    response: Response,
+    db: Union[Session, AsyncSession] = Depends(get_session)
+):
+    try:
+        header, items = invoice_values(invoice_request)
+    except ValueError as e:
+        # Invalid date or total, reported like the other validation errors
+        raise HTTPException(status_code=422, detail=str(e))
+    if isinstance(db, AsyncSession) and not words_worker.WORDS_ASYNC:
+        # Not inside run_sync: it runs on the event loop, where an engine call would stall every request
+        header["final_price_in_words"] = await run_in_threadpool(words_in_own_session, header["final_price"])
+    invoice = await run_db(db, _create_invoice, invoice_request, header, items)
+    pin_to_primary(response)
+    return invoice
+
+BULK_BATCH_SIZE = 500
+# Bodies up to this size stay in memory while they are received, larger ones go to a temporary file
+BULK_SPOOL_BYTES = 1024 * 1024
+# A JSON array is parsed in one piece; larger imports must be sent as NDJSON, read line by line
+BULK_MAX_JSON_BYTES = 32 * 1024 * 1024
+
+async def spool_body(request: Request, limit: Optional[int]):
+    # The request body, read chunk by chunk into a SpooledTemporaryFile positioned at its start
+    body = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_BYTES)
+    size = 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if limit is not None and size > limit:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"JSON array bodies are limited to {limit} bytes, send larger imports as NDJSON."
+                )
+            # Past BULK_SPOOL_BYTES this is a file write
+            await run_in_threadpool(body.write, chunk)
+    except BaseException:
+        body.close()
+        raise
+    body.seek(0)
+    return body
+
+def parse_bulk_body(body, ndjson: bool):
+    """
+    Yields (index, InvoiceRequest or error message) without stopping at the first invalid entry.
+    NDJSON lines are read from the file one at a time. Closes body once exhausted.
+    """
+    if ndjson:
+        entries = (line for line in body if line.strip())
+    else:
+        try:
+            entries = orjson.loads(body.read())
+        except ValueError as e:
+            body.close()
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
+        if not isinstance(entries, list):
+            body.close()
+            raise HTTPException(status_code=400, detail="The body must be a JSON array of invoices.")
+
+    def validated():
+        try:
+            for index, entry in enumerate(entries):
+                try:
+                    if ndjson:
+                        yield index, InvoiceRequest.model_validate_json(entry)
+                    else:
+                        yield index, InvoiceRequest.model_validate(entry)
+                except ValidationError as e:
+                    yield index, str(e)
+        finally:
+            body.close()
+
+    return validated()
+
+def create_invoice_batch(batch, db: Session):
+    """
+    Insert one batch of validated requests in a single transaction and return
+    (index, header dict) pairs, plus (index, error) pairs for invalid dates and totals.
+    """
+    results = []
+    rows = []
+    for index, invoice_request in batch:
+        try:
+            header, items = invoice_values(invoice_request)
+        except ValueError as e:
+            results.append((index, str(e)))
+            continue
+        rows.append((index, header, items))
+
+    # Words first: the month counters below stay locked until commit
+    if words_worker.WORDS_ASYNC:
+        all_words = [None] * len(rows)
+    else:
+        all_words = numbers_to_words([header["final_price"] for _, header, _ in rows], db)
+    for (_, header, _), words in zip(rows, all_words):
+        header["final_price_in_words"] = words
+
+    # Allocate one block of numbers per month, handed out in request order. Months are
+    # locked in sorted order so that concurrent batches cannot deadlock on their counters.
+    per_month = Counter((header["invoice_date"].year, header["invoice_date"].month) for _, header, _ in rows)
+    next_number = {}
+    for (year, month), count in sorted(per_month.items()):
+        next_number[(year, month)] = allocate_invoice_numbers(year, month, count, db) - count + 1
+
+    for _, header, _ in rows:
+        key = (header["invoice_date"].year, header["invoice_date"].month)
+        header["invoice_number"] = format_invoice_number(*key, next_number[key])
+        next_number[key] += 1
+
+    invoice_ids = []
+    if rows:
+        invoice_ids = db.execute(
+            insert(Invoice).returning(Invoice.invoice_id, sort_by_parameter_order=True),
+            [header for _, header, _ in rows],
+        ).scalars().all()
+
+        item_rows = [
+            {**item, "invoice_id": invoice_id}
+            for invoice_id, (_, _, items) in zip(invoice_ids, rows)
+            for item in items
+        ]
+        if item_rows:
+            db.execute(insert(Item), item_rows)
+
+    db.commit()
+
+    for invoice_id, (index, header, _) in zip(invoice_ids, rows):
+        if header["final_price_in_words"] is None:
+            words_worker.submit_words(invoice_id, header["final_price"])
+        results.append((index, header))
+
+    return sorted(results, key=lambda result: result[0])
+
+def bulk_result_lines(batch, db: Session):
+    try:
+        results = create_invoice_batch(batch, db)
+    except SQLAlchemyError as e:
+        db.rollback()
+        results = [(index, f"Database error: {e.__class__.__name__}") for index, _ in batch]
+    except Exception as e:
+        # Any other failure still gets one line per entry instead of ending the stream silently
+        db.rollback()
+        results = [(index, f"Internal error: {e.__class__.__name__}") for index, _ in batch]
+
+    for index, result in results:
+        if isinstance(result, str):
+            yield orjson.dumps({"index": index, "error": result}) + b"\n"
+        else:
+            yield orjson.dumps({"index": index, **invoice_response(result).model_dump()}) + b"\n"
+
+def stream_bulk_results(entries):
+    # Own session: the request's dependencies are closed before the body is streamed
+    db = SessionLocal()
+    try:
+        batch = []
+        for index, entry in entries:
+            if isinstance(entry, str):
+                yield orjson.dumps({"index": index, "error": entry}) + b"\n"
+                continue
+            batch.append((index, entry))
+            if len(batch) >= BULK_BATCH_SIZE:
+                yield from bulk_result_lines(batch, db)
+                batch = []
+        if batch:
+            yield from bulk_result_lines(batch, db)
+    finally:
+        db.close()
+
+@app.post("/create_invoices")
+async def create_invoices(request: Request):
+    """
+    Create many invoices from a JSON array or an NDJSON stream (Content-Type: application/x-ndjson)
+    of invoice requests. Results are streamed back as NDJSON, one line per invoice with its "index"
+    in the input and either the created invoice or an "error".
+    The body is spooled as it arrives (to disk past BULK_SPOOL_BYTES) before the first invoice is
+    written: a client that sends its whole body before reading the response would otherwise stall
+    both sides once the response fills the socket buffers.
+    """
+    ndjson = "ndjson" in request.headers.get("content-type", "")
+    body = await spool_body(request, None if ndjson else BULK_MAX_JSON_BYTES)
+    entries = await run_in_threadpool(parse_bulk_body, body, ndjson)
+    response = StreamingResponse(stream_bulk_results(entries), media_type="application/x-ndjson")
+    pin_to_primary(response)
+    return response
+
+
+INVOICES_PAGE_SIZE = 100
+INVOICES_MAX_PAGE_SIZE = 1000
+
+def parse_filter_date(value: str, name: str) -> date:
+    try:
+        return datetime.strptime(value, "%d/%m/%Y").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date in the format DD/MM/YYYY.")
+
+# Columns read by GET /invoices: the response fields plus invoice_date for the cursor
+INVOICE_LIST_COLUMNS = (
+    Invoice.invoice_date,
+    Invoice.invoice_number,
+    Invoice.subtotal_ht,
+    Invoice.montant_tva,
+    Invoice.timbre_price,
+    Invoice.final_price,
+    Invoice.final_price_in_words,
+)
+
+def invoices_query(
+    db: Session,
     year: Optional[int] = None,
     month: Optional[int] = None,
     day: Optional[int] = None,
-    db: Session = Depends(get_db)
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
-    query = db.query(Invoice)
+    """
+    Build the ordered query of GET /invoices. Date filters are half-open
+    invoice_date ranges so that ix_invoices_date_number can serve them.
+    Only INVOICE_LIST_COLUMNS are selected: rows are plain tuples, not ORM objects.
+    """
+    query = db.query(*INVOICE_LIST_COLUMNS)
 
-    if year:
-        query = query.filter(func.extract('year', Invoice.invoice_date) == year)
-    if month:
+    try:
+        if year and month:
+            start = date(year, month, day or 1)
+            end = start + timedelta(days=1) if day else date(year + month // 12, month % 12 + 1, 1)
+            query = query.filter(Invoice.invoice_date >= start, Invoice.invoice_date < end)
+        elif year:
+            query = query.filter(Invoice.invoice_date >= date(year, 1, 1), Invoice.invoice_date < date(year + 1, 1, 1))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date filter: {e}")
+
+    # A month or day without the enclosing year / month is not a single range
+    if month and not year:
         query = query.filter(func.extract('month', Invoice.invoice_date) == month)
-    if day:
+    if day and not (year and month):
         query = query.filter(func.extract('day', Invoice.invoice_date) == day)
 
-    invoices = query.all()
-
-    # Convert to response model
-    invoice_responses = [
-        InvoiceResponse(
-            invoice_number=invoice.invoice_number,
-            subtotal_ht=float(f"{invoice.subtotal_ht:.3f}"),
-            montant_tva=float(f"{invoice.montant_tva:.3f}"),
-            timbre_price=float(f"{invoice.timbre_price:.3f}"),
-            final_price=float(f"{invoice.final_price:.3f}"),
-            final_price_in_words=invoice.final_price_in_words,
-        )
-        for invoice in invoices
-    ]
+    if date_from:
+        query = query.filter(Invoice.invoice_date >= parse_filter_date(date_from, "date_from"))
+    if date_to:
+        query = query.filter(Invoice.invoice_date < parse_filter_date(date_to, "date_to") + timedelta(days=1))
 
-    return JSONResponse(content=jsonable_encoder(invoice_responses))
+    # Keyset pagination over (invoice_date, invoice_number), served by ix_invoices_date_number
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(tuple_(Invoice.invoice_date, Invoice.invoice_number) > after)
 
-@app.delete("/delete_invoice")
-def delete_invoice(
-    invoice_id: Optional[int] = None, 
-    invoice_number: Optional[str] = None, 
-    db: Session = Depends(get_db)
+    return query.order_by(Invoice.invoice_date, Invoice.invoice_number)
+
+INVOICES_STREAM_BATCH = 1000
+
+def invoice_row(invoice) -> dict:
+    # JSON object of an invoices_query row, same fields as InvoiceResponse
+    return {
+        "invoice_number": invoice.invoice_number,
+        "subtotal_ht": float(invoice.subtotal_ht),
+        "montant_tva": float(invoice.montant_tva),
+        "timbre_price": float(invoice.timbre_price),
+        "final_price": float(invoice.final_price),
+        "final_price_in_words": invoice.final_price_in_words,
+        "words_pending": invoice.final_price_in_words is None,
+    }
+
+def _get_invoices(
+    db: Session,
+    year: Optional[int],
+    month: Optional[int],
+    day: Optional[int],
+    date_from: Optional[str],
+    date_to: Optional[str],
+    limit: int,
+    cursor: Optional[str],
 ):
+    query = invoices_query(db, year, month, day, date_from, date_to, cursor)
+
+    # One extra row tells whether there is a next page
+    invoices = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(invoices) > limit:
+        invoices = invoices[:limit]
+        next_cursor = encode_cursor(invoices[-1].invoice_date, invoices[-1].invoice_number)
+
+    # Encode the rows straight into the response body
+    with phase("serialize"):
+        body = b"[" + b",".join(orjson.dumps(invoice_row(invoice)) for invoice in invoices) + b"]"
+
+    return body, next_cursor
+
+def stream_invoices(db: Session, query):
     """
-    Delete an invoice by ID or invoice number.
-    - invoice_id: int -> Delete based on invoice ID.
-    - invoice_number: str -> Delete based on invoice number.
+    NDJSON lines of every invoice of the query, read through a server-side cursor
+    INVOICES_STREAM_BATCH rows at a time so memory does not grow with the result.
+    """
+    try:
+        lines = []
+        for invoice in query.yield_per(INVOICES_STREAM_BATCH):
+            lines.append(orjson.dumps(invoice_row(invoice)) + b"\n")
+            if len(lines) >= INVOICES_STREAM_BATCH:
+                yield b"".join(lines)
+                lines = []
+        if lines:
+            yield b"".join(lines)
+    finally:
+        db.close()
+
+@app.get("/invoices", response_model=List[InvoiceResponse])
+async def get_invoices(
+    request: Request,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    day: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=INVOICES_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: Union[Session, AsyncSession] = Depends(get_read_session)
+):
     """
+    List invoices ordered by invoice date and number, one page at a time.
+    - date_from / date_to: str -> Inclusive DD/MM/YYYY bounds of the invoice date.
+    - limit: int -> Page size (default 100, at most 1000).
+    - cursor: str -> Value of the X-Next-Cursor header of the previous page.
+    - format: str -> "ndjson" (or Accept: application/x-ndjson) streams every matching
+      invoice after the cursor, one JSON object per line, instead of a page.
+    """
+    if format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", "")):
+        # Own session: the request's dependencies are closed before the body is streamed
+        stream_db = read_sessionmaker(request)()
+        try:
+            query = invoices_query(stream_db, year, month, day, date_from, date_to, cursor)
+        except HTTPException:
+            stream_db.close()
+            raise
+        if limit:
+            query = query.limit(limit)
+        return StreamingResponse(stream_invoices(stream_db, query), media_type="application/x-ndjson")
+
+    body, next_cursor = await run_db(
+        db, _get_invoices, year, month, day, date_from, date_to, limit or INVOICES_PAGE_SIZE, cursor
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return conditional_response(request, body, etag_for(body), headers)
+
+def _delete_invoice(db: Session, invoice_id: Optional[int], invoice_number: Optional[str]):
     if not invoice_id and not invoice_number:
         raise HTTPException(status_code=400, detail="You must provide either invoice_id or invoice_number.")
     
@@ -213,20 +720,37 @@ def delete_invoice(
 
     # Delete the invoice
     db.delete(invoice)
-    db.commit()
-    
-    return {"message": f"Invoice has been deleted successfully."}
+    with phase("commit"):
+        db.commit()
+    invoice_details_cache.invalidate(invoice.invoice_id)
 
-@app.get("/invoice_details", response_model=InvoiceDetailResponse)
-def invoice_details(
-    invoice_number: Optional[str] = None,
-    invoice_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    return invoice.invoice_number
+
+@app.delete("/delete_invoice")
+async def delete_invoice(
+    response: Response,
+    invoice_id: Optional[int] = None, 
+    invoice_number: Optional[str] = None, 
+    db: Union[Session, AsyncSession] = Depends(get_session)
 ):
+    """
+    Delete an invoice by ID or invoice number.
+    - invoice_id: int -> Delete based on invoice ID.
+    - invoice_number: str -> Delete based on invoice number.
+    """
+    deleted_number = await run_db(db, _delete_invoice, invoice_id, invoice_number)
+    # Filesystem work stays out of run_db, which runs on the event loop for async sessions
+    with phase("cleanup"):
+        await run_in_threadpool(rendering.remove_invoice_pdfs, deleted_number)
+    pin_to_primary(response)
+    return {"message": f"Invoice has been deleted successfully."}
+
+def _invoice_details(db: Session, invoice_number: Optional[str], invoice_id: Optional[int]) -> tuple:
     if not invoice_number and not invoice_id:
         raise HTTPException(status_code=400, detail="You must provide either invoice_id or invoice_number.")
     
-    invoice_query = db.query(Invoice).join(Item, Invoice.invoice_id == Item.invoice_id)
+    # Header and items in one statement (LEFT OUTER JOIN), invoices without items included
+    invoice_query = db.query(Invoice).options(joinedload(Invoice.items))
     
     if invoice_id:
         invoice_query = invoice_query.filter(Invoice.invoice_id == invoice_id)
@@ -238,26 +762,225 @@ def invoice_details(
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found.")
     
-    items = db.query(Item).filter(Item.invoice_id == invoice.invoice_id).all()
+    with phase("serialize"):
+        body = orjson.dumps(invoice_detail(invoice, invoice.items))
+        etag = etag_for(body)
+
+    # Invoices with pending words still change once, when the worker fills them
+    if invoice.final_price_in_words is not None:
+        invoice_details_cache.put(invoice.invoice_id, invoice.invoice_number, body, etag)
 
-    invoice_detail_response = InvoiceDetailResponse(
+    return body, etag
+
+@app.get("/invoice_archive")
+async def invoice_archive(
+    year: int,
+    month: int = Query(..., ge=1, le=12),
+    db: Union[Session, AsyncSession] = Depends(get_read_session)
+):
+    """
+    ZIP of the PDFs of every invoice of a month, streamed as the PDFs become available.
+    Cached PDFs are reused, the others are rendered by a process pool of ARCHIVE_WORKERS
+    processes shared by all archive requests.
+    """
+    invoices = await run_db(db, archive.month_invoice_details, year, month)
+    if not invoices:
+        raise HTTPException(status_code=404, detail="No invoices in this month.")
+    # Same as /invoice_pdf: words are generated by the worker, never on this request
+    pending = archive.pending_words(invoices)
+    if pending:
+        raise HTTPException(
+            status_code=409, detail=f"Invoices of this month with the amount in words still pending: {pending}."
+        )
+
+    try:
+        await run_in_threadpool(archive.check_renderer, invoices)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="invoices_{year}_{month:02d}.zip"',
+        "X-Invoice-Count": str(len(invoices)),
+    }
+    return StreamingResponse(
+        archive.stream_zip(archive.invoice_pdf_paths(invoices)), media_type="application/zip", headers=headers
+    )
+
+def _invoice_exists(db: Session, invoice_id: int) -> bool:
+    return db.query(Invoice.invoice_id).filter(Invoice.invoice_id == invoice_id).first() is not None
+
+async def load_invoice_details(db: Union[Session, AsyncSession], invoice_number: Optional[str], invoice_id: Optional[int]) -> tuple:
+    # (body, etag) of an invoice, from the details cache when possible
+    cached = invoice_details_cache.get(invoice_id, invoice_number)
+    if cached is None:
+        return await run_db(db, _invoice_details, invoice_number, invoice_id)
+
+    # Another worker or instance may have deleted it: a primary key lookup instead of the full load
+    cached_id, body, etag = cached
+    if not await run_db(db, _invoice_exists, cached_id):
+        invoice_details_cache.invalidate(cached_id)
+        raise HTTPException(status_code=404, detail="Invoice not found.")
+    return body, etag
+
+@app.get("/invoice_details", response_model=InvoiceDetailResponse)
+async def invoice_details(
+    request: Request,
+    invoice_number: Optional[str] = None,
+    invoice_id: Optional[int] = None,
+    db: Union[Session, AsyncSession] = Depends(get_read_session)
+):
+    """
+    Details of an invoice with a strong ETag. Payloads are kept in an in-process LRU, so
+    repeated and conditional (If-None-Match) requests only check that the invoice still exists.
+    """
+    body, etag = await load_invoice_details(db, invoice_number, invoice_id)
+    return conditional_response(request, body, etag)
+
+@app.get("/invoice_pdf")
+async def invoice_pdf(
+    invoice_number: Optional[str] = None,
+    invoice_id: Optional[int] = None,
+    db: Union[Session, AsyncSession] = Depends(get_read_session)
+):
+    """
+    Invoice rendered to PDF on the server (templates/invoice.html + WeasyPrint).
+    PDFs are stored in PDF_CACHE_DIR by invoice content and template version, so
+    repeated downloads send the stored file instead of rendering again.
+    """
+    body, _ = await load_invoice_details(db, invoice_number, invoice_id)
+    invoice = orjson.loads(body)
+    if invoice["words_pending"]:
+        raise HTTPException(status_code=409, detail="The amount in words of this invoice is still pending.")
+
+    try:
+        path = await run_in_threadpool(rendering.invoice_pdf_path, invoice)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return FileResponse(path, media_type="application/pdf", filename=f"{invoice['invoice_number']}.pdf")
+
+DETAILS_BATCH_MAX = 10000
+
+def invoice_details_batch_queries(db: Session, batch_request: InvoiceDetailsBatchRequest):
+    """
+    The two queries of POST /invoice_details/batch: the requested invoices and all of
+    their items, both ordered by invoice_id so they can be merged while streaming.
+    """
+    requested = len(batch_request.invoice_numbers) + len(batch_request.invoice_ids)
+    if not requested:
+        raise HTTPException(status_code=400, detail="You must provide invoice_numbers or invoice_ids.")
+    if requested > DETAILS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {DETAILS_BATCH_MAX} invoices can be requested at once.")
+
+    condition = or_(
+        Invoice.invoice_number.in_(batch_request.invoice_numbers),
+        Invoice.invoice_id.in_(batch_request.invoice_ids),
+    )
+    invoice_query = db.query(Invoice).filter(condition).order_by(Invoice.invoice_id)
+    item_query = db.query(Item).filter(
+        Item.invoice_id.in_(select(Invoice.invoice_id).where(condition))
+    ).order_by(Item.invoice_id, Item.item_id)
+    return invoice_query, item_query
+
+def _invoice_details_batch(db: Session, batch_request: InvoiceDetailsBatchRequest) -> Response:
+    invoice_query, item_query = invoice_details_batch_queries(db, batch_request)
+    details = merge_invoice_details(invoice_query.all(), item_query.all())
+    body = b"[" + b",".join(orjson.dumps(detail) for detail in details) + b"]"
+    return Response(content=body, media_type="application/json")
+
+def stream_invoice_details(db: Session, invoice_query, item_query):
+    # NDJSON lines of the merged details, both queries read through server-side cursors
+    try:
+        lines = []
+        details = merge_invoice_details(
+            invoice_query.yield_per(INVOICES_STREAM_BATCH), item_query.yield_per(INVOICES_STREAM_BATCH)
+        )
+        for detail in details:
+            lines.append(orjson.dumps(detail) + b"\n")
+            if len(lines) >= INVOICES_STREAM_BATCH:
+                yield b"".join(lines)
+                lines = []
+        if lines:
+            yield b"".join(lines)
+    finally:
+        db.close()
+
+@app.post("/invoice_details/batch", response_model=List[InvoiceDetailResponse])
+async def invoice_details_batch(
+    batch_request: InvoiceDetailsBatchRequest,
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    db: Union[Session, AsyncSession] = Depends(get_read_session)
+):
+    """
+    Details of many invoices with two queries in total, ordered by invoice_id.
+    Requested invoices that do not exist are left out of the result.
+    - format: str -> "ndjson" (or Accept: application/x-ndjson) streams one invoice per line.
+    """
+    if format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", "")):
+        # Own session: the request's dependencies are closed before the body is streamed
+        stream_db = read_sessionmaker(request)()
+        try:
+            invoice_query, item_query = invoice_details_batch_queries(stream_db, batch_request)
+        except HTTPException:
+            stream_db.close()
+            raise
+        return StreamingResponse(
+            stream_invoice_details(stream_db, invoice_query, item_query), media_type="application/x-ndjson"
+        )
+
+    return await run_db(db, _invoice_details_batch, batch_request)
+
+@app.get("/invoice_words", response_model=InvoiceWordsResponse)
+def invoice_words(
+    invoice_number: Optional[str] = None,
+    invoice_id: Optional[int] = None,
+    wait: float = 0,
+    db: Session = Depends(get_db)
+):
+    """
+    Poll the amount in words of an invoice. Always read from the primary: the words are
+    polled right after a create, before a replica may have them.
+    - wait: float -> Seconds to wait for pending words (at most 30).
+    """
+    if not invoice_number and not invoice_id:
+        raise HTTPException(status_code=400, detail="You must provide either invoice_id or invoice_number.")
+
+    invoice_query = db.query(Invoice.invoice_id, Invoice.invoice_number, Invoice.final_price_in_words)
+
+    if invoice_id:
+        invoice_query = invoice_query.filter(Invoice.invoice_id == invoice_id)
+    elif invoice_number:
+        invoice_query = invoice_query.filter(Invoice.invoice_number == invoice_number)
+
+    invoice = invoice_query.first()
+
+    if not invoice:
+        raise HTTPException(status_code=404, detail="Invoice not found.")
+
+    words = invoice.final_price_in_words
+    if words is None and wait > 0:
+        # Give the connection back to the pool for the wait; wait_words polls with its own short sessions
+        db.close()
+        words = words_worker.wait_words(invoice.invoice_id, min(wait, 30))
+
+    return InvoiceWordsResponse(
         invoice_number=invoice.invoice_number,
-        client_name=invoice.client_name,
-        vat_number=invoice.vat_number,
-        address=invoice.address,
-        invoice_date=invoice.invoice_date.strftime("%d/%m/%Y"),
-        subtotal_ht=float(f"{invoice.subtotal_ht:.3f}"),
-        montant_tva=float(f"{invoice.montant_tva:.3f}"),
-        timbre_price=float(f"{invoice.timbre_price:.3f}"),
-        final_price=float(f"{invoice.final_price:.3f}"),
-        final_price_in_words=invoice.final_price_in_words,
-        items=[ItemResponse(
-            reference=item.reference,
-            quantity=item.quantity,
-            designation=item.designation,
-            unit_price=item.unit_price,
-            total_price=float(f"{item.total_price:.3f}"),  # Round total_price for each item
-        ) for item in items]
+        final_price_in_words=words,
+        words_pending=words is None
     )
-    
-    return invoice_detail_response
+
+@app.get("/amount_words_cache")
+def amount_words_cache_stats():
+    """
+    Hit / miss / eviction counters of the in-process amount words cache.
+    """
+    return amount_words_cache.stats()
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """
+    Prometheus text exposition of this process' metrics.
+    """
+    body, content_type = metrics.latest()
+    return Response(body, media_type=content_type)
@@ -0,0 +1,143 @@
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.routing import Match
+
+# Prometheus metrics of this process, served by GET /metrics. Updates are a lock and
+# an addition, cheap enough to stay on; pool gauges are only read when scraped.
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ["method", "route", "status"]
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "HTTP requests being served by route.", ["method", "route"]
+)
+
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time to get a connection from the SQLAlchemy pool.", ["engine"], buckets=POOL_WAIT_BUCKETS
+)
+POOL_CHECKOUTS = Counter("db_pool_checkouts", "Connections checked out of the SQLAlchemy pool.", ["engine"])
+
+# From microseconds (cache hits) to the seconds an LLM engine can take
+NUMBER_TO_WORDS_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+NUMBER_TO_WORDS_SECONDS = Histogram(
+    "number_to_words_duration_seconds", "number_to_words latency by where the words came from.", ["source"],
+    buckets=NUMBER_TO_WORDS_BUCKETS,
+)
+NUMBER_TO_WORDS_ERRORS = Counter("number_to_words_errors", "Failed number_to_words engine calls.", ["engine"])
+WORDS_FILL_FAILURES = Counter(
+    "words_fill_failures", "Background words jobs that gave up, leaving the invoice pending until the next restart."
+)
+
+INVOICE_NUMBER_ALLOCATION_SECONDS = Histogram(
+    "invoice_number_allocation_duration_seconds", "Duration of the invoice_sequences UPSERT."
+)
+
+class TimedPoolMixin:
+    # Records how long each checkout waited for a connection
+    metrics_engine = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT_SECONDS.labels(self.metrics_engine).observe(time.perf_counter() - start)
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_engine = "async"
+
+class TimedReplicaQueuePool(TimedQueuePool):
+    metrics_engine = "replica"
+
+class TimedAsyncReplicaQueuePool(TimedAsyncAdaptedQueuePool):
+    metrics_engine = "async_replica"
+
+class PoolCollector:
+    # Size, checked-out and overflow connections of the engine pools, read at scrape time
+    def __init__(self):
+        self.engines = {}
+
+    def collect(self):
+        gauges = {
+            "size": GaugeMetricFamily("db_pool_size", "Configured pool size.", labels=["engine"]),
+            "checkedout": GaugeMetricFamily("db_pool_checked_out", "Connections in use.", labels=["engine"]),
+            "checkedin": GaugeMetricFamily("db_pool_checked_in", "Idle connections in the pool.", labels=["engine"]),
+            "overflow": GaugeMetricFamily("db_pool_overflow", "Connections open beyond the pool size.", labels=["engine"]),
+        }
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            for attribute, gauge in gauges.items():
+                if hasattr(pool, attribute):
+                    # QueuePool.overflow() starts at -pool_size until the pool is full
+                    gauge.add_metric([name], max(getattr(pool, attribute)(), 0))
+        return list(gauges.values())
+
+pool_collector = PoolCollector()
+REGISTRY.register(pool_collector)
+
+def instrument_engine(engine, name: str):
+    # Pool gauges and checkout counter of an engine (the sync engine of an AsyncEngine)
+    pool_collector.engines[name] = engine
+    checkouts = POOL_CHECKOUTS.labels(name)
+    event.listen(engine, "checkout", lambda *args: checkouts.inc())
+
+# (method, path) -> route path of the routes without path parameters, so that matching
+# the routes again (about 13 us) is skipped; other paths are matched every time
+_route_names = {}
+
+def route_name(scope) -> str:
+    # Route path template of the request, so that labels stay bounded whatever the URL
+    key = (scope["method"], scope["path"])
+    name = _route_names.get(key)
+    if name is not None:
+        return name
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            if not route.param_convertors:
+                _route_names[key] = route.path
+            return route.path
+    return "unmatched"
+
+class MetricsMiddleware:
+    """
+    ASGI middleware keeping the in-progress gauge and latency histogram of each route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_name(scope)
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - start)
+
+def latest() -> tuple:
+    # (body, content type) of the Prometheus text exposition
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
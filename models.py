@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -11,23 +11,47 @@ class Invoice(Base):
     vat_number = Column(String)
     address = Column(String)
     invoice_date = Column(Date)
-    subtotal_ht = Column(Float)
-    montant_tva = Column(Float)
-    timbre_price = Column(Float)
-    final_price = Column(Float)
+    # Amounts in dinars with millime precision, see money.py
+    subtotal_ht = Column(Numeric(14, 3))
+    montant_tva = Column(Numeric(14, 3))
+    timbre_price = Column(Numeric(14, 3))
+    final_price = Column(Numeric(14, 3))
     final_price_in_words = Column(String)
 
-    items = relationship("Item", back_populates="invoice")
+    items = relationship("Item", back_populates="invoice", order_by="Item.item_id")
+
+    __table_args__ = (
+        # Keyset pagination and date range filters of GET /invoices
+        Index("ix_invoices_date_number", "invoice_date", "invoice_number"),
+    )
 
 class Item(Base):
     __tablename__ = "items"
 
     item_id = Column(Integer, primary_key=True, index=True)
-    invoice_id = Column(Integer, ForeignKey("invoices.invoice_id"))
+    invoice_id = Column(Integer, ForeignKey("invoices.invoice_id"), index=True)
     reference = Column(String)
     quantity = Column(Integer)
     designation = Column(String)
-    unit_price = Column(Float)
-    total_price = Column(Float)
+    unit_price = Column(Numeric(14, 3))
+    total_price = Column(Numeric(14, 3))
 
     invoice = relationship("Invoice", back_populates="items")
+
+
+class AmountWords(Base):
+    __tablename__ = "amount_words"
+
+    # Amount in integer millimes (59.850 TND -> 59850)
+    millimes = Column(BigInteger, primary_key=True)
+    # NUMBER_TO_WORDS_ENGINE that wrote the words: switching engines does not serve the old output
+    engine = Column(String, primary_key=True)
+    words = Column(String, nullable=False)
+
+class InvoiceSequence(Base):
+    __tablename__ = "invoice_sequences"
+
+    # Last suffix handed out for the invoices of a month (MMYY_XXX -> XXX)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    last_value = Column(Integer, nullable=False)
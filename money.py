@@ -0,0 +1,38 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# Amounts are handled as integer millimes (1 TND = 1000 millimes) so that sums and
+# the TVA are exact. The database stores them as NUMERIC(14, 3) dinars.
+
+MILLIMES_PER_DINAR = 1000
+
+# Montant TVA rate, in percent of the subtotal HT
+TVA_RATE_PERCENT = 7
+
+# Fixed timbre fiscal (1 dinar)
+TIMBRE_MILLIMES = 1000
+
+MILLIME = Decimal("0.001")
+
+# NUMERIC(14, 3) columns hold amounts strictly between -10^11 and 10^11 dinars
+MAX_DINARS = 10 ** 11
+
+def to_millimes(amount) -> int:
+    """
+    Convert an amount in dinars (int, float, str or Decimal) to integer millimes,
+    rounding half up. Floats go through their shortest repr, so 12.345 is 12345.
+    """
+    if isinstance(amount, int):
+        return amount * MILLIMES_PER_DINAR
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int(amount.quantize(MILLIME, rounding=ROUND_HALF_UP) * MILLIMES_PER_DINAR)
+
+def percent_of(millimes: int, percent: int) -> int:
+    # Integer-only percentage, rounded half away from zero to the millime like to_millimes,
+    # so a credit line gets the opposite TVA of the same debit line
+    magnitude = (abs(millimes) * percent * 2 + 100) // 200
+    return magnitude if millimes >= 0 else -magnitude
+
+def to_decimal(millimes: int) -> Decimal:
+    # Value bound to NUMERIC(14, 3) columns: 59850 -> Decimal("59.850")
+    return Decimal(millimes).scaleb(-3)
@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+from threading import Lock
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from PIL import Image
+from dotenv import load_dotenv
+import orjson
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, "templates")
+# Relative URLs of the template resolve against the front-end folder
+ASSETS_DIR = os.path.join(BASE_DIR, "form")
+LOGO_PATH = os.path.join(ASSETS_DIR, "images", "logo.png")
+# The logo is shown 150 CSS px wide: 450 px keeps it sharp at 300 dpi
+LOGO_WIDTH = 450
+
+# Bump whenever templates/invoice.html, invoice.css or the logo change, so cached PDFs are rendered again
+TEMPLATE_VERSION = "2"
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(BASE_DIR, "pdf_cache"))
+
+def format_amount(value: float) -> str:
+    # Same text as the front-end prints for a JS number: 59.85 -> "59.85", 1.0 -> "1"
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+templates = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html"]))
+templates.filters["amount"] = format_amount
+
+# Compiled once: get_template would otherwise stat the file on every render
+invoice_template = templates.get_template("invoice.html")
+
+with open(os.path.join(TEMPLATE_DIR, "invoice.css"), encoding="utf-8") as f:
+    INVOICE_CSS = f.read()
+
+@lru_cache(maxsize=None)
+def logo_data_uri(path: str = LOGO_PATH, width: int = LOGO_WIDTH) -> str:
+    # PNG data URI of the logo scaled down to width, so renders neither read nor decode the full-size file
+    with Image.open(path) as image:
+        image.thumbnail((width, width * image.height // image.width), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+def render_invoice_html(invoice: dict) -> str:
+    """
+    Render the invoice HTML, equivalent to generateInvoiceHTML in form/invoices.html.
+    The styles are in templates/invoice.css and applied by render_invoice_pdf.
+    - invoice: dict -> Invoice details, as returned by /invoice_details.
+    """
+    return invoice_template.render(invoice=invoice, logo_src=logo_data_uri())
+
+_weasyprint = None
+_weasyprint_error = None
+_stylesheet = None
+_font_config = None
+_lock = Lock()
+
+def load_weasyprint():
+    """
+    Import WeasyPrint and parse the invoice stylesheet and font configuration, once per process.
+    WeasyPrint needs Pango from the system, so it is only imported when PDFs are rendered;
+    a failed import is remembered and raised again as RuntimeError.
+    """
+    global _weasyprint, _weasyprint_error, _stylesheet, _font_config
+    with _lock:
+        if _weasyprint is None and _weasyprint_error is None:
+            try:
+                import weasyprint
+                from weasyprint.text.fonts import FontConfiguration
+            except (ImportError, OSError) as e:
+                _weasyprint_error = f"PDF rendering is not available: {e}"
+            else:
+                _font_config = FontConfiguration()
+                _stylesheet = weasyprint.CSS(string=INVOICE_CSS, font_config=_font_config)
+                _weasyprint = weasyprint
+        if _weasyprint_error:
+            raise RuntimeError(_weasyprint_error)
+        return _weasyprint
+
+def warm_up():
+    # Called at startup and in each archive worker process, so the first render does not pay for it
+    logo_data_uri()
+    try:
+        load_weasyprint()
+    except RuntimeError:
+        pass
+
+def render_invoice_pdf(invoice: dict) -> bytes:
+    weasyprint = load_weasyprint()
+    return weasyprint.HTML(string=render_invoice_html(invoice), base_url=ASSETS_DIR).write_pdf(
+        stylesheets=[_stylesheet], font_config=_font_config
+    )
+
+def invoice_pdf_key(invoice: dict) -> str:
+    # Content address: same invoice content and template version -> same PDF
+    content = orjson.dumps(invoice, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(content + TEMPLATE_VERSION.encode()).hexdigest()
+
+def invoice_pdf_cache_path(invoice: dict) -> str:
+    # Where the PDF of this invoice content is stored, whether it was rendered yet or not
+    return os.path.join(PDF_CACHE_DIR, invoice["invoice_number"], f"{invoice_pdf_key(invoice)}.pdf")
+
+def invoice_pdf_path(invoice: dict) -> str:
+    """
+    Path of the invoice PDF in PDF_CACHE_DIR, rendering and storing it on the first request.
+    Files live in PDF_CACHE_DIR/<invoice_number>/<key>.pdf so an invoice's PDFs can be removed on delete.
+    """
+    path = invoice_pdf_cache_path(invoice)
+    if os.path.exists(path):
+        return path
+    invoice_dir = os.path.dirname(path)
+
+    pdf = render_invoice_pdf(invoice)
+
+    # Write to a temporary file first so concurrent requests never send a half-written PDF
+    os.makedirs(invoice_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=invoice_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+def remove_invoice_pdfs(invoice_number: str):
+    shutil.rmtree(os.path.join(PDF_CACHE_DIR, invoice_number), ignore_errors=True)
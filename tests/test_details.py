@@ -0,0 +1,97 @@
+"""
+merge_invoice_details: invoices and their items read with two queries, merged in one pass.
+
+    python -m pytest tests
+"""
+import os
+import sys
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# utils imports the models; the tests below use their own database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from database import Base
+from models import Invoice, Item
+from utils import merge_invoice_details
+import archive
+
+
+def invoice(invoice_id):
+    return SimpleNamespace(
+        invoice_id=invoice_id, invoice_number=f"1224_{invoice_id:03d}", client_name="Client", vat_number="1",
+        address="Sfax", invoice_date=date(2024, 12, 1), subtotal_ht=Decimal("10.000"), montant_tva=Decimal("0.700"),
+        timbre_price=Decimal("1.000"), final_price=Decimal("11.700"), final_price_in_words="Onze dinars",
+    )
+
+
+def item(invoice_id, reference):
+    return SimpleNamespace(
+        invoice_id=invoice_id, reference=reference, quantity=1, designation="d",
+        unit_price=Decimal("10.000"), total_price=Decimal("10.000"),
+    )
+
+
+def merged(invoice_ids, items):
+    return {
+        detail["invoice_number"]: [line["reference"] for line in detail["items"]]
+        for detail in merge_invoice_details([invoice(i) for i in invoice_ids], items)
+    }
+
+
+@pytest.mark.parametrize("invoice_ids, items, expected", [
+    ([], [], {}),
+    ([1], [], {"1224_001": []}),
+    ([1, 2, 3], [], {"1224_001": [], "1224_002": [], "1224_003": []}),
+    # Invoices without items first, in the middle and last
+    ([1, 2, 3, 4, 5], [item(2, "a"), item(2, "b"), item(4, "c")],
+     {"1224_001": [], "1224_002": ["a", "b"], "1224_003": [], "1224_004": ["c"], "1224_005": []}),
+    ([1, 2], [item(1, "a"), item(1, "b"), item(1, "c")], {"1224_001": ["a", "b", "c"], "1224_002": []}),
+    ([1, 2], [item(2, "a")], {"1224_001": [], "1224_002": ["a"]}),
+])
+def test_merge_invoice_details(invoice_ids, items, expected):
+    assert merged(invoice_ids, items) == expected
+
+
+def test_merge_keeps_invoice_order_and_fields():
+    details = list(merge_invoice_details([invoice(3), invoice(7)], [item(7, "x")]))
+    assert [detail["invoice_number"] for detail in details] == ["1224_003", "1224_007"]
+    assert details[0]["items"] == []
+    assert details[0]["final_price"] == 11.7
+    assert details[1]["items"] == [
+        {"reference": "x", "quantity": 1, "designation": "d", "unit_price": 10.0, "total_price": 10.0}
+    ]
+
+
+def test_month_details_include_invoices_without_items(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'details.db'}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        for n in range(1, 6):
+            db.add(Invoice(
+                invoice_number=f"1224_{n:03d}", invoice_date=date(2024, 12, n), subtotal_ht=Decimal("1.000"),
+                montant_tva=Decimal("0.070"), timbre_price=Decimal("1.000"), final_price=Decimal("2.070"),
+                final_price_in_words="Deux dinars et soixante-dix millimes",
+            ))
+        db.flush()
+        ids = {row.invoice_number: row.invoice_id for row in db.query(Invoice)}
+        # Items inserted out of invoice order; only invoices 2 and 4 have any
+        for number, reference in [("1224_004", "c"), ("1224_002", "a"), ("1224_002", "b")]:
+            db.add(Item(invoice_id=ids[number], reference=reference, quantity=1, designation="d",
+                        unit_price=Decimal("1.000"), total_price=Decimal("1.000")))
+        db.commit()
+
+        details = archive.month_invoice_details(db, 2024, 12)
+        assert {detail["invoice_number"]: [line["reference"] for line in detail["items"]] for detail in details} == {
+            "1224_001": [], "1224_002": ["a", "b"], "1224_003": [], "1224_004": ["c"], "1224_005": [],
+        }
+    finally:
+        db.close()
+        engine.dispose()
@@ -0,0 +1,185 @@
+"""
+GET /invoices: keyset cursors, date range filters and pagination, on a SQLite file.
+
+    python -m pytest tests
+"""
+import base64
+import os
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+
+import orjson
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# main creates its tables at import; the tests below use their own database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from database import Base
+from models import Invoice
+from utils import decode_cursor, encode_cursor
+import main
+
+DATES = [
+    date(2023, 12, 31),
+    date(2024, 1, 1),
+    date(2024, 3, 15),
+    date(2024, 11, 30),
+    date(2024, 12, 1),
+    date(2024, 12, 15),
+    date(2024, 12, 31),
+    date(2025, 1, 1),
+    date(2025, 3, 15),
+]
+
+
+def add_invoices(db, dates):
+    # One invoice per date, numbered MMYY_XXX in the order given
+    counters = {}
+    for invoice_date in dates:
+        key = invoice_date.strftime("%m%y")
+        counters[key] = counters.get(key, 0) + 1
+        db.add(Invoice(
+            invoice_number=f"{key}_{counters[key]:03d}", client_name="Client", vat_number="1", address="Sfax",
+            invoice_date=invoice_date, subtotal_ht=Decimal("100.000"), montant_tva=Decimal("7.000"),
+            timbre_price=Decimal("1.000"), final_price=Decimal("108.000"), final_price_in_words="Cent huit dinars",
+        ))
+    db.commit()
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'invoices.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def listed_dates(db, **filters):
+    return [row.invoice_date for row in main.invoices_query(db, **filters)]
+
+
+@pytest.mark.parametrize("invoice_date, invoice_number", [
+    (date(2024, 12, 31), "1224_001"),
+    (date(1999, 1, 1), "0199_999"),
+    (date(2024, 2, 29), "numéro spécial/+="),
+])
+def test_cursor_round_trip(invoice_date, invoice_number):
+    cursor = encode_cursor(invoice_date, invoice_number)
+    # URL safe and unpadded, so it can go in a query string as is
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == (invoice_date, invoice_number)
+
+
+def b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "!!!",
+    "abc",
+    b64(b"not json"),
+    b64(b"\xff\xfe"),
+    b64(b"null"),
+    b64(b'{"date": "2024-12-31"}'),
+    b64(b'["2024-12-31"]'),
+    b64(b'["2024-12-31", "1224_001", "extra"]'),
+    b64(b'[20241231, "1224_001"]'),
+    b64(b'["2024-13-01", "1224_001"]'),
+])
+def test_decode_cursor_rejects_bad_input(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_invoices_query_bad_cursor_is_400(db):
+    with pytest.raises(HTTPException) as e:
+        main.invoices_query(db, cursor="!!!")
+    assert e.value.status_code == 400
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({}, DATES),
+    ({"year": 2024}, DATES[1:7]),
+    # December ends at the first of January of the next year
+    ({"year": 2024, "month": 12}, [date(2024, 12, 1), date(2024, 12, 15), date(2024, 12, 31)]),
+    ({"year": 2024, "month": 12, "day": 31}, [date(2024, 12, 31)]),
+    ({"year": 2024, "month": 11, "day": 30}, [date(2024, 11, 30)]),
+    # A month or a day without its year / month matches it in every year / month
+    ({"month": 3}, [date(2024, 3, 15), date(2025, 3, 15)]),
+    ({"day": 15}, [date(2024, 3, 15), date(2024, 12, 15), date(2025, 3, 15)]),
+    ({"year": 2024, "day": 15}, [date(2024, 3, 15), date(2024, 12, 15)]),
+    ({"month": 12, "day": 31}, [date(2023, 12, 31), date(2024, 12, 31)]),
+    # date_from and date_to are both inclusive
+    ({"date_from": "01/12/2024", "date_to": "31/12/2024"}, [date(2024, 12, 1), date(2024, 12, 15), date(2024, 12, 31)]),
+    ({"date_to": "01/01/2025"}, DATES[:8]),
+    ({"date_from": "01/01/2025"}, DATES[7:]),
+    ({"date_from": "31/12/2024", "date_to": "31/12/2024"}, [date(2024, 12, 31)]),
+    ({"year": 2024, "date_from": "15/12/2024"}, [date(2024, 12, 15), date(2024, 12, 31)]),
+])
+def test_invoices_query_ranges(db, filters, expected):
+    add_invoices(db, DATES)
+    assert listed_dates(db, **filters) == expected
+
+
+@pytest.mark.parametrize("filters", [
+    {"year": 2024, "month": 2, "day": 30},
+    {"year": 2024, "month": 13},
+    {"date_from": "2024-12-01"},
+    {"date_to": "32/12/2024"},
+])
+def test_invoices_query_invalid_filters_are_400(db, filters):
+    with pytest.raises(HTTPException) as e:
+        main.invoices_query(db, **filters)
+    assert e.value.status_code == 400
+
+
+def all_pages(db, limit, **filters):
+    numbers = []
+    cursor = None
+    while True:
+        body, cursor = main._get_invoices(
+            db, filters.get("year"), filters.get("month"), filters.get("day"),
+            filters.get("date_from"), filters.get("date_to"), limit, cursor,
+        )
+        page = [row["invoice_number"] for row in orjson.loads(body)]
+        assert len(page) <= limit
+        numbers.extend(page)
+        if cursor is None:
+            return numbers
+        # Only the last page has no cursor
+        assert len(page) == limit
+
+
+@pytest.mark.parametrize("limit", [1, 7, 25, 249, 250, 1000])
+def test_pagination_has_no_gaps_or_duplicates(db, limit):
+    # 250 invoices over 10 days: most pages start and end in the middle of a day
+    start = date(2024, 12, 28)
+    add_invoices(db, [start + timedelta(days=n % 10) for n in range(250)])
+    rows = [(row.invoice_date, row.invoice_number) for row in main.invoices_query(db)]
+    assert rows == sorted(rows)
+    expected = [number for _, number in rows]
+
+    numbers = all_pages(db, limit)
+    assert numbers == expected
+    assert len(set(numbers)) == 250
+
+
+def test_pagination_with_filter(db):
+    add_invoices(db, [date(2024, 12, 1) + timedelta(days=n % 45) for n in range(300)])
+    expected = [row.invoice_number for row in main.invoices_query(db, year=2024, month=12)]
+    assert len(expected) == 216
+    assert all_pages(db, 16, year=2024, month=12) == expected
+
+
+def test_empty_page_has_no_cursor(db):
+    body, cursor = main._get_invoices(db, 2024, 12, None, None, None, 10, None)
+    assert orjson.loads(body) == []
+    assert cursor is None
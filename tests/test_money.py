@@ -0,0 +1,84 @@
+"""
+Millime arithmetic of money.py: conversions and the TVA rounding.
+
+    python -m pytest tests
+"""
+import os
+import sys
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import money
+
+
+@pytest.mark.parametrize("amount, millimes", [
+    (0, 0),
+    (12, 12_000),
+    (-3, -3_000),
+    (12.345, 12_345),
+    (0.1, 100),
+    (59.85, 59_850),
+    # Halves round away from zero, on the shortest repr of the float
+    (1.0005, 1_001),
+    (2.675, 2_675),
+    (0.0005, 1),
+    (-0.0005, -1),
+    (-4.35, -4_350),
+    (-1.0005, -1_001),
+    (1e-4, 0),
+])
+def test_to_millimes_float(amount, millimes):
+    assert money.to_millimes(amount) == millimes
+
+
+@pytest.mark.parametrize("amount, millimes", [
+    (Decimal("59.850"), 59_850),
+    (Decimal("0.0015"), 2),
+    (Decimal("0.0014999"), 1),
+    (Decimal("-0.0015"), -2),
+    (Decimal("99999999999.999"), 99_999_999_999_999),
+    ("12.345", 12_345),
+])
+def test_to_millimes_decimal(amount, millimes):
+    assert money.to_millimes(amount) == millimes
+
+
+@pytest.mark.parametrize("millimes, percent, expected", [
+    (0, 7, 0),
+    (55_000, 7, 3_850),
+    (4_350, 7, 305),      # 304.5 rounds up
+    (-4_350, 7, -305),    # and a credit line mirrors it
+    (4_357, 7, 305),      # 304.99
+    (-4_357, 7, -305),
+    (4_342, 7, 304),      # 303.94
+    (-4_342, 7, -304),
+    (1, 7, 0),            # 0.07
+    (-1, 7, 0),
+    (50, 1, 1),           # 0.5
+    (-50, 1, -1),
+])
+def test_percent_of(millimes, percent, expected):
+    assert money.percent_of(millimes, percent) == expected
+
+
+@pytest.mark.parametrize("millimes", [1, 999, 4_350, 55_000, 123_456_789])
+def test_percent_of_is_odd(millimes):
+    assert money.percent_of(-millimes, money.TVA_RATE_PERCENT) == -money.percent_of(millimes, money.TVA_RATE_PERCENT)
+
+
+@pytest.mark.parametrize("millimes, value", [
+    (0, "0.000"),
+    (59_850, "59.850"),
+    (1, "0.001"),
+    (-4_350, "-4.350"),
+    (99_999_999_999_999, "99999999999.999"),
+])
+def test_to_decimal(millimes, value):
+    decimal = money.to_decimal(millimes)
+    assert decimal == Decimal(value)
+    # Three decimals, as NUMERIC(14, 3) stores them
+    assert decimal.as_tuple().exponent == -3
+    assert money.to_millimes(decimal) == millimes
@@ -0,0 +1,61 @@
+"""
+Golden amounts of the local number_to_words engine, from 0.001 to 10^9 dinars.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+from num2words import num2words
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# utils imports the models; the engine is created but never connected to
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from utils import _french_integer, local_number_to_words
+
+GOLDEN = [
+    # (millimes, words)
+    (0, "Zéro dinar"),
+    (1, "Un millime"),
+    (2, "Deux millimes"),
+    (71, "Soixante et onze millimes"),
+    (80, "Quatre-vingts millimes"),
+    (999, "Neuf cent quatre-vingt-dix-neuf millimes"),
+    (1_000, "Un dinar"),
+    (1_001, "Un dinar et un millime"),
+    (1_500, "Un dinar et cinq cents millimes"),
+    (21_000, "Vingt et un dinars"),
+    (59_850, "Cinquante-neuf dinars et huit cent cinquante millimes"),
+    (71_000, "Soixante et onze dinars"),
+    (71_071, "Soixante et onze dinars et soixante et onze millimes"),
+    (80_000, "Quatre-vingts dinars"),
+    (80_080, "Quatre-vingts dinars et quatre-vingts millimes"),
+    (200_000, "Deux cents dinars"),
+    (1_000_000, "Mille dinars"),
+    (1_000_001, "Mille dinars et un millime"),
+    (80_000_000, "Quatre-vingt mille dinars"),
+    (180_000_000, "Cent quatre-vingt mille dinars"),
+    (200_000_000, "Deux cent mille dinars"),
+    (1_000_000_000, "Un million de dinars"),
+    (2_000_000_000, "Deux millions de dinars"),
+    (1_999_999_999, "Un million neuf cent quatre-vingt-dix-neuf mille neuf cent quatre-vingt-dix-neuf dinars"
+                    " et neuf cent quatre-vingt-dix-neuf millimes"),
+    (1_000_000_000_000, "Un milliard de dinars"),
+    (1_000_000_000_001, "Un milliard de dinars et un millime"),
+    (-1, "Moins un millime"),
+    (-4_350, "Moins quatre dinars et trois cent cinquante millimes"),
+    (-80_000, "Moins quatre-vingts dinars"),
+]
+
+
+@pytest.mark.parametrize("millimes, words", GOLDEN)
+def test_golden_amounts(millimes, words):
+    assert local_number_to_words(millimes) == words
+
+
+def test_integers_match_num2words():
+    # Every number below 2000, then a sample up to 200 000 (the whole range takes ~30 s)
+    for n in [*range(2000), *range(2000, 200_001, 97)]:
+        assert _french_integer(n) == num2words(n, lang="fr"), n
@@ -0,0 +1,113 @@
+import logging
+import os
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from dotenv import load_dotenv
+import orjson
+
+load_dotenv()
+
+# Per-request phase timings in a Server-Timing header and a JSON log line. Off by default:
+# phase() then costs one context variable lookup and no middleware or SQL hooks are installed.
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
+
+logger = logging.getLogger("elkolla.timing")
+
+# Phase name -> seconds of the current request, None outside a timed request
+_timings: ContextVar[Optional[dict]] = ContextVar("timings", default=None)
+
+class _Phase:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: dict, name: str):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+_untimed = nullcontext()
+
+def phase(name: str):
+    """
+    Time a block as a phase of the current request. Time of repeated phases adds up.
+    - name: str -> Server-Timing metric name (a token: letters, digits, "_").
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _untimed
+    return _Phase(timings, name)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings.get() is not None:
+        conn.info["timing_start"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _timings.get()
+    start = conn.info.pop("timing_start", None)
+    if timings is not None and start is not None:
+        timings["db"] = timings.get("db", 0.0) + time.perf_counter() - start
+
+def instrument_engine(engine):
+    # "db" phase: time spent in SQL statements, whichever phase runs them
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def server_timing_header(timings: dict, total: float) -> str:
+    metrics = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware timing each HTTP request: the phases recorded with phase() during
+    the request go in a Server-Timing header of the response and in one JSON log line
+    once the response is complete.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            logger.info(orjson.dumps({
+                "event": "request",
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+            }).decode())
+
+if SERVER_TIMING and not logger.handlers:
+    # uvicorn only configures its own loggers
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
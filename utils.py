@@ -1,69 +1,466 @@
-from datetime import datetime
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import func
-from models import Invoice
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Invoice, AmountWords, InvoiceSequence
+from money import to_millimes
+import metrics
 from dotenv import load_dotenv
-from openai import OpenAI
+import base64
+import time
+import json
 import os
 
 load_dotenv()
-from openai import OpenAI
-client = OpenAI()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Engine used by number_to_words: "local" (default) or "openai"
+NUMBER_TO_WORDS_ENGINE = os.getenv("NUMBER_TO_WORDS_ENGINE", "local").lower()
+
+# Maximum number of amounts kept in the in-process words cache
+AMOUNT_WORDS_CACHE_SIZE = int(os.getenv("AMOUNT_WORDS_CACHE_SIZE", "4096"))
+INVOICE_DETAILS_CACHE_SIZE = int(os.getenv("INVOICE_DETAILS_CACHE_SIZE", "1024"))
+
+# The OpenAI client is only created when the "openai" engine is first used
+client = None
+
+def dialect_insert(db: Session):
+    # INSERT construct supporting ON CONFLICT for the session's database
+    if db.get_bind().dialect.name == "sqlite":
+        return sqlite.insert
+    return postgresql.insert
+
+
+def format_invoice_number(year: int, month: int, number: int) -> str:
+    # Generate the invoice number in the format MMYY_XXX
+    month_year = f"{str(month).zfill(2)}{str(year)[-2:]}"  # MMYY
+    return f"{month_year}_{str(number).zfill(3)}"
+
+def allocate_invoice_numbers(year: int, month: int, count: int, db: Session) -> int:
+    """
+    Reserve count consecutive suffixes for a month and return the last one.
+    The counter row stays locked until the caller commits, so concurrent creates
+    get distinct numbers without scanning invoices.
+    """
+    insert = dialect_insert(db)
+    stmt = insert(InvoiceSequence).values(year=year, month=month, last_value=count)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[InvoiceSequence.year, InvoiceSequence.month],
+        set_={"last_value": InvoiceSequence.last_value + count},
+    ).returning(InvoiceSequence.last_value)
+    with metrics.INVOICE_NUMBER_ALLOCATION_SECONDS.time():
+        return db.execute(stmt).scalar_one()
+
 def generate_invoice_number(invoice_date: str, db: Session) -> str:
     # Convert the provided invoice_date to datetime.date
     invoice_date_obj = datetime.strptime(invoice_date, "%d/%m/%Y").date()
     month = invoice_date_obj.month
     year = invoice_date_obj.year
 
-    # Query the database for the last invoice in the same month and year
-    last_invoice = (
-        db.query(Invoice)
-        .filter(
-            func.extract('month', Invoice.invoice_date) == month,
-            func.extract('year', Invoice.invoice_date) == year
+    new_number = allocate_invoice_numbers(year, month, 1, db)
+    return format_invoice_number(year, month, new_number)
+
+def seed_invoice_sequences(db: Session):
+    """
+    Create the invoice_sequences rows of a database that has invoices but no counters yet,
+    continuing from the highest existing suffix of each month.
+    """
+    if db.query(InvoiceSequence).first() is not None:
+        return
+
+    last_values = {}
+    rows = db.query(Invoice.invoice_date, Invoice.invoice_number).yield_per(10000)
+    for invoice_date, invoice_number in rows:
+        key = (invoice_date.year, invoice_date.month)
+        number = int(invoice_number.split('_')[-1])
+        if number > last_values.get(key, 0):
+            last_values[key] = number
+
+    if last_values:
+        insert = dialect_insert(db)
+        db.execute(
+            insert(InvoiceSequence).on_conflict_do_nothing(),
+            [{"year": year, "month": month, "last_value": last_value}
+             for (year, month), last_value in last_values.items()],
         )
-        .order_by(Invoice.invoice_number.desc())
-        .first()
-    )
+    db.commit()
+
+def encode_cursor(invoice_date: date, invoice_number: str) -> str:
+    # Opaque keyset cursor of GET /invoices: the (invoice_date, invoice_number) of the last row sent
+    raw = json.dumps([invoice_date.isoformat(), invoice_number]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        invoice_date, invoice_number = json.loads(raw)
+        return date.fromisoformat(invoice_date), str(invoice_number)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+def invoice_detail(invoice: Invoice, items) -> dict:
+    # Same fields as main.InvoiceDetailResponse, as a plain dict for orjson
+    return {
+        "invoice_number": invoice.invoice_number,
+        "client_name": invoice.client_name,
+        "vat_number": invoice.vat_number,
+        "address": invoice.address,
+        "invoice_date": invoice.invoice_date.strftime("%d/%m/%Y"),
+        "subtotal_ht": float(invoice.subtotal_ht),
+        "montant_tva": float(invoice.montant_tva),
+        "timbre_price": float(invoice.timbre_price),
+        "final_price": float(invoice.final_price),
+        "final_price_in_words": invoice.final_price_in_words,
+        "words_pending": invoice.final_price_in_words is None,
+        "items": [{
+            "reference": item.reference,
+            "quantity": item.quantity,
+            "designation": item.designation,
+            "unit_price": float(item.unit_price),
+            "total_price": float(item.total_price),
+        } for item in items]
+    }
 
-    # Extract the last invoice number suffix or set it to 0 if no invoices exist
-    if last_invoice:
-        last_number = int(last_invoice.invoice_number.split('_')[-1])
+def merge_invoice_details(invoices, items):
+    # Both inputs are ordered by invoice_id: hand each invoice its run of items
+    items = iter(items)
+    item = next(items, None)
+    for invoice in invoices:
+        invoice_items = []
+        while item is not None and item.invoice_id == invoice.invoice_id:
+            invoice_items.append(item)
+            item = next(items, None)
+        yield invoice_detail(invoice, invoice_items)
+
+_UNITS = [
+    "zéro", "un", "deux", "trois", "quatre", "cinq", "six", "sept", "huit", "neuf",
+    "dix", "onze", "douze", "treize", "quatorze", "quinze", "seize",
+    "dix-sept", "dix-huit", "dix-neuf",
+]
+_TENS = ["", "", "vingt", "trente", "quarante", "cinquante", "soixante"]
+
+def _french_below_100(n: int) -> str:
+    if n < 20:
+        return _UNITS[n]
+    tens, unit = divmod(n, 10)
+    if tens in (7, 9):
+        # 70-79 and 90-99 are built on soixante / quatre-vingt + 10..19
+        base = "soixante" if tens == 7 else "quatre-vingt"
+        rest = _UNITS[10 + unit]
+        return f"{base} et {rest}" if n == 71 else f"{base}-{rest}"
+    base = "quatre-vingt" if tens == 8 else _TENS[tens]
+    if unit == 0:
+        return "quatre-vingts" if tens == 8 else base
+    if unit == 1 and tens != 8:
+        return f"{base} et un"
+    return f"{base}-{_UNITS[unit]}"
+
+def _french_below_1000(n: int, plural: bool = True) -> str:
+    # "plural" is False when the group is followed by "mille", which keeps
+    # "cent" and "quatre-vingt" invariable (deux cent mille, quatre-vingt mille)
+    hundreds, rest = divmod(n, 100)
+    if hundreds == 0:
+        words = _french_below_100(rest)
+        return words if plural or rest != 80 else "quatre-vingt"
+    head = "cent" if hundreds == 1 else f"{_UNITS[hundreds]} cent"
+    if rest == 0:
+        return head + "s" if plural and hundreds > 1 else head
+    words = _french_below_100(rest)
+    if not plural and rest == 80:
+        words = "quatre-vingt"
+    return f"{head} {words}"
+
+def _french_integer(n: int) -> str:
+    if n < 1000:
+        return _french_below_1000(n)
+
+    parts = []
+    milliards, n = divmod(n, 1_000_000_000)
+    millions, n = divmod(n, 1_000_000)
+    thousands, n = divmod(n, 1000)
+
+    if milliards:
+        parts.append(f"{_french_integer(milliards)} milliard{'s' if milliards > 1 else ''}")
+    if millions:
+        parts.append(f"{_french_below_1000(millions)} million{'s' if millions > 1 else ''}")
+    if thousands:
+        parts.append("mille" if thousands == 1 else f"{_french_below_1000(thousands, plural=False)} mille")
+    if n:
+        parts.append(_french_below_1000(n))
+    return " ".join(parts)
+
+def _french_amount(value: int, unit: str) -> str:
+    # "un dinar", "deux dinars", "un million de dinars"
+    words = _french_integer(value)
+    if value > 1:
+        unit += "s"
+    if words.endswith(("million", "millions", "milliard", "milliards")):
+        return f"{words} de {unit}"
+    return f"{words} {unit}"
+
+def local_number_to_words(amount_millimes: int) -> str:
+    if amount_millimes < 0:
+        # Credit notes: divmod would floor -4350 to -5 dinars and 650 millimes
+        words = local_number_to_words(-amount_millimes)
+        return "Moins " + words[0].lower() + words[1:]
+
+    dinars, millimes = divmod(amount_millimes, 1000)
+
+    if dinars and millimes:
+        words = f"{_french_amount(dinars, 'dinar')} et {_french_amount(millimes, 'millime')}"
+    elif millimes:
+        words = _french_amount(millimes, "millime")
     else:
-        last_number = 0
+        words = _french_amount(dinars, "dinar")
 
-    # Increment the last number by 1
-    new_number = last_number + 1
+    return words[0].upper() + words[1:]
 
-    # Generate the new invoice number in the format MMYY_XXX
-    month_year = f"{str(month).zfill(2)}{str(year)[-2:]}"  # MMYY
-    return f"{month_year}_{str(new_number).zfill(3)}"
+def openai_number_to_words(amount_millimes: int) -> str:
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI()
+
+    dinars, millimes = divmod(abs(amount_millimes), 1000)
+    number_formatted = f"{'-' if amount_millimes < 0 else ''}{dinars}.{millimes:03d}"
+
+    # Create the chat completion
+    response = client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {
+                "role": "user",
+                "content": f"je vais te donner un montant en dinars en chiffre et tu dois me répondre juste avec le montant en lettres et donner moi aussi les millimes pas les centimes, si y 'a pas des millimes càd ,000 ce n'est pas la pene d'ecrire avec aucun millime le montant est {number_formatted}"
+            }
+        ],
+        temperature=1,
+        max_tokens=100,  # Use a reasonable max_tokens limit
+        top_p=1,
+        frequency_penalty=0,
+        presence_penalty=0
+    )
+
+    # Access the content of the first choice
+    return response.choices[0].message.content
 
-def number_to_words(number: float) -> str:
-    number_formatted = "{:.3f}".format(number)
-    
+NUMBER_TO_WORDS_ENGINES = {
+    "local": local_number_to_words,
+    "openai": openai_number_to_words,
+}
+
+if NUMBER_TO_WORDS_ENGINE not in NUMBER_TO_WORDS_ENGINES:
+    raise ValueError(f"Unknown NUMBER_TO_WORDS_ENGINE: {NUMBER_TO_WORDS_ENGINE!r}")
+
+class AmountWordsCache:
+    """
+    Bounded LRU of amount words keyed by integer millimes.
+    - hits / misses: lookups served or not by this cache.
+    - db_hits: misses served by the amount_words table.
+    - evictions: entries dropped to stay under maxsize.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self.evictions = 0
+
+    def get(self, millimes: int) -> Optional[str]:
+        with self._lock:
+            words = self._entries.get(millimes)
+            if words is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(millimes)
+            self.hits += 1
+            return words
+
+    def put(self, millimes: int, words: str, from_db: bool = False):
+        with self._lock:
+            if from_db:
+                self.db_hits += 1
+            if self.maxsize <= 0:
+                return
+            self._entries[millimes] = words
+            self._entries.move_to_end(millimes)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "db_hits": self.db_hits,
+                "evictions": self.evictions,
+            }
+
+amount_words_cache = AmountWordsCache(AMOUNT_WORDS_CACHE_SIZE)
+
+class InvoiceDetailsCache:
+    """
+    Bounded LRU of serialized /invoice_details payloads and their ETags, reachable by
+    invoice_id or invoice_number. Invoices never change once their words are filled,
+    so entries only leave on delete (invalidate) or eviction. Deletes handled by other
+    processes are not seen here: callers check that a hit still exists. Deleted ids
+    are remembered, so a lagging read replica cannot put a deleted invoice back.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # invoice_id -> (invoice_number, body, etag)
+        self._ids = {}  # invoice_number -> invoice_id
+        self._deleted = OrderedDict()  # invoice_id -> None, the last maxsize deletes
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, invoice_id: Optional[int] = None, invoice_number: Optional[str] = None) -> Optional[tuple]:
+        # (invoice_id, body, etag) of a cached invoice
+        with self._lock:
+            if not invoice_id:
+                invoice_id = self._ids.get(invoice_number)
+            entry = self._entries.get(invoice_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(invoice_id)
+            self.hits += 1
+            return invoice_id, entry[1], entry[2]
+
+    def put(self, invoice_id: int, invoice_number: str, body: bytes, etag: str):
+        with self._lock:
+            if self.maxsize <= 0 or invoice_id in self._deleted:
+                return
+            self._entries[invoice_id] = (invoice_number, body, etag)
+            self._entries.move_to_end(invoice_id)
+            self._ids[invoice_number] = invoice_id
+            while len(self._entries) > self.maxsize:
+                _, (number, _, _) = self._entries.popitem(last=False)
+                self._ids.pop(number, None)
+                self.evictions += 1
+
+    def invalidate(self, invoice_id: int):
+        with self._lock:
+            entry = self._entries.pop(invoice_id, None)
+            if entry is not None:
+                self._ids.pop(entry[0], None)
+            self._deleted[invoice_id] = None
+            if len(self._deleted) > self.maxsize:
+                self._deleted.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+invoice_details_cache = InvoiceDetailsCache(INVOICE_DETAILS_CACHE_SIZE)
+
+def engine_number_to_words(millimes: int) -> str:
+    # The configured word generator, with its errors counted for /metrics
     try:
-        # Create the chat completion
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"je vais te donner un montant en dinars en chiffre et tu dois me répondre juste avec le montant en lettres et donner moi aussi les millimes pas les centimes, si y 'a pas des millimes càd ,000 ce n'est pas la pene d'ecrire avec aucun millime le montant est {number_formatted}"
-                }
-            ],
-            temperature=1,
-            max_tokens=100,  # Use a reasonable max_tokens limit
-            top_p=1,
-            frequency_penalty=0,
-            presence_penalty=0
-        )
-        
-        # Access the content of the first choice
-        words = response.choices[0].message.content
-        return words
-    
+        return NUMBER_TO_WORDS_ENGINES[NUMBER_TO_WORDS_ENGINE](millimes)
+    except Exception:
+        metrics.NUMBER_TO_WORDS_ERRORS.labels(NUMBER_TO_WORDS_ENGINE).inc()
+        raise
+
+# Labelled once: labels() costs about as much as a cache hit
+_number_to_words_seconds = {
+    source: metrics.NUMBER_TO_WORDS_SECONDS.labels(source) for source in ("cache", "db", "engine", "error")
+}
+
+def number_to_words(number: float, db: Optional[Session] = None, raise_errors: bool = False) -> str:
+    """
+    Amount in words, from the caches or the configured engine.
+    - raise_errors: bool -> Raise the engine error instead of returning an "Error: ..." text.
+    """
+    start = time.perf_counter()
+    words, source = _number_to_words(number, db, raise_errors)
+    _number_to_words_seconds[source].observe(time.perf_counter() - start)
+    return words
+
+def _number_to_words(number: float, db: Optional[Session], raise_errors: bool = False) -> tuple:
+    # (words, source): source is where the words came from, "cache", "db", "engine" or "error"
+    millimes = to_millimes(number)
+
+    # 1. In-process LRU
+    words = amount_words_cache.get(millimes)
+    if words is not None:
+        return words, "cache"
+
+    # 2. Persistent amount_words table
+    if db is not None:
+        stored = db.get(AmountWords, (millimes, NUMBER_TO_WORDS_ENGINE))
+        if stored is not None:
+            amount_words_cache.put(millimes, stored.words, from_db=True)
+            return stored.words, "db"
+
+    # 3. Word generator; failures are returned but never cached
+    try:
+        words = engine_number_to_words(millimes)
     except Exception as e:
-        return f"Error: Unable to convert number to words. {str(e)}"
\ No newline at end of file
+        if raise_errors:
+            raise
+        return f"Error: Unable to convert number to words. {str(e)}", "error"
+
+    amount_words_cache.put(millimes, words)
+    if db is not None:
+        # Written in the caller's transaction; a concurrent writer of the same amount is not an error
+        insert = dialect_insert(db)
+        db.execute(insert(AmountWords).values(
+            millimes=millimes, engine=NUMBER_TO_WORDS_ENGINE, words=words
+        ).on_conflict_do_nothing())
+    return words, "engine"
+
+def numbers_to_words(numbers: list, db: Session) -> list:
+    """
+    Batch version of number_to_words: one SELECT for the amounts missing from the
+    in-process cache and one multi-row INSERT for the newly generated ones.
+    """
+    millimes_list = [to_millimes(number) for number in numbers]
+    found = {}
+    for millimes in set(millimes_list):
+        words = amount_words_cache.get(millimes)
+        if words is not None:
+            found[millimes] = words
+
+    missing = set(millimes_list) - found.keys()
+    if missing:
+        stored_rows = db.query(AmountWords).filter(
+            AmountWords.engine == NUMBER_TO_WORDS_ENGINE, AmountWords.millimes.in_(missing)
+        )
+        for stored in stored_rows:
+            amount_words_cache.put(stored.millimes, stored.words, from_db=True)
+            found[stored.millimes] = stored.words
+
+    # Sorted, so that concurrent batches insert (and lock) shared amounts in the same order
+    generated = []
+    for millimes in sorted(set(millimes_list) - found.keys()):
+        try:
+            words = engine_number_to_words(millimes)
+        except Exception as e:
+            found[millimes] = f"Error: Unable to convert number to words. {str(e)}"
+            continue
+        amount_words_cache.put(millimes, words)
+        found[millimes] = words
+        generated.append({"millimes": millimes, "engine": NUMBER_TO_WORDS_ENGINE, "words": words})
+
+    if generated:
+        insert = dialect_insert(db)
+        db.execute(insert(AmountWords).on_conflict_do_nothing(), generated)
+
+    return [found[millimes] for millimes in millimes_list]
@@ -0,0 +1,122 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError
+from threading import Event, Lock
+from typing import Optional
+from database import SessionLocal
+from models import Invoice
+from utils import number_to_words, NUMBER_TO_WORDS_ENGINE
+import metrics
+
+logger = logging.getLogger("elkolla.words")
+
+# Fill final_price_in_words after the invoice is committed instead of during the request.
+# Defaults to on for remote engines, where the words can take seconds to come back.
+WORDS_ASYNC = os.getenv("WORDS_ASYNC", "false" if NUMBER_TO_WORDS_ENGINE == "local" else "true").lower() == "true"
+WORDS_WORKERS = int(os.getenv("WORDS_WORKERS", "4"))
+WORDS_POLL_INTERVAL = 0.25
+# Attempts of a words job before it gives up, waiting 1 s, 2 s, 4 s... between them
+WORDS_ATTEMPTS = int(os.getenv("WORDS_ATTEMPTS", "5"))
+
+_executor = ThreadPoolExecutor(max_workers=WORDS_WORKERS, thread_name_prefix="words")
+_pending = {}  # invoice_id -> Future
+_lock = Lock()
+_stopping = Event()
+
+def _store_words(invoice_id: int, final_price: float) -> str:
+    db = SessionLocal()
+    try:
+        # Engine errors raise: the column stays NULL rather than holding the error text
+        words = number_to_words(final_price, db, raise_errors=True)
+        db.query(Invoice).filter(Invoice.invoice_id == invoice_id).update(
+            {Invoice.final_price_in_words: words}, synchronize_session=False
+        )
+        db.commit()
+        return words
+    finally:
+        db.close()
+
+def fill_words(invoice_id: int, final_price: float) -> str:
+    """
+    Store the words of an invoice, retrying with exponential backoff. After
+    WORDS_ATTEMPTS failures the invoice stays pending until the next restart.
+    """
+    for attempt in range(1, WORDS_ATTEMPTS + 1):
+        try:
+            return _store_words(invoice_id, final_price)
+        except Exception:
+            if attempt == WORDS_ATTEMPTS or _stopping.is_set():
+                metrics.WORDS_FILL_FAILURES.inc()
+                logger.exception("Words of invoice %s failed after %s attempts, left pending", invoice_id, attempt)
+                raise
+            logger.warning("Words of invoice %s failed (attempt %s), retrying", invoice_id, attempt, exc_info=True)
+            # Cut short by shutdown()
+            _stopping.wait(2 ** (attempt - 1))
+
+def submit_words(invoice_id: int, final_price: float) -> Future:
+    with _lock:
+        future = _pending.get(invoice_id)
+        if future is not None:
+            return future
+        future = _executor.submit(fill_words, invoice_id, final_price)
+        _pending[invoice_id] = future
+
+    def _done(_):
+        with _lock:
+            _pending.pop(invoice_id, None)
+
+    future.add_done_callback(_done)
+    return future
+
+def wait_words(invoice_id: int, timeout: float) -> Optional[str]:
+    """
+    Wait up to timeout seconds for the words of an invoice.
+    Returns None if they are still pending afterwards.
+    """
+    deadline = time.monotonic() + timeout
+
+    with _lock:
+        future = _pending.get(invoice_id)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except TimeoutError:
+            return None
+        except Exception:
+            # The job gave up and logged why: the words stay pending
+            return None
+
+    # The job may belong to another worker process: poll the database, holding a
+    # pooled connection only for each query, not across the sleeps
+    while True:
+        db = SessionLocal()
+        try:
+            words = (
+                db.query(Invoice.final_price_in_words)
+                .filter(Invoice.invoice_id == invoice_id)
+                .scalar()
+            )
+        finally:
+            db.close()
+        if words is not None or time.monotonic() >= deadline:
+            return words
+        time.sleep(WORDS_POLL_INTERVAL)
+
+def resume_pending_words():
+    # Invoices committed before a restart whose words were never filled
+    db = SessionLocal()
+    try:
+        pending = (
+            db.query(Invoice.invoice_id, Invoice.final_price)
+            .filter(Invoice.final_price_in_words.is_(None))
+            .all()
+        )
+    finally:
+        db.close()
+    for invoice_id, final_price in pending:
+        submit_words(invoice_id, final_price)
+
+def shutdown():
+    _stopping.set()
+    _executor.shutdown(wait=True)